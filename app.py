@@ -1,9 +1,17 @@
 import dash
 import dash_bootstrap_components as dbc
+import pandas as pd
 from dash import Dash, dcc, html, Output, Input
 from flask import session
 from flask_session import Session
 
+from utils.instrumentation import instrument_app
+
+# Copy-on-write: seleções de colunas e filtros viram views preguiçosas,
+# então as páginas podem "modificar" seus recortes sem copiar (nem alterar)
+# a tabela compartilhada (utils.data.get_dataset).
+pd.set_option("mode.copy_on_write", True)
+
 # Inicializa o app Dash
 app = Dash(
     __name__,
@@ -117,5 +125,9 @@ def render_page(pathname):
 
     return dash.page_container, pathname
 
+
+# Métricas por callback e endpoint /metrics (ativados com METRICS_ENABLED=1)
+instrument_app(app)
+
 if __name__ == "__main__":
     app.run_server(debug=True, host="0.0.0.0", port=8050)
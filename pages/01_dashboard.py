@@ -2,6 +2,9 @@ import dash
 from dash import callback, dcc, html, Input, Output, dash_table
 import dash_bootstrap_components as dbc
 from utils.functions import create_card, create_table
+from utils.data import get_dataset
+from utils.cubes import get_cubes, query_cube
+from utils.cache import memoize
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
@@ -19,9 +22,9 @@ import warnings
 warnings.filterwarnings("ignore")
 
 # dataset
-df = pd.read_csv(
-    "data/sales.csv",
-    usecols=[
+df = get_dataset(
+    "sales",
+    columns=[
         "date",
         "codigo",
         "year",
@@ -36,6 +39,8 @@ df = pd.read_csv(
         "qty",
     ],
 )
+# Monta os cubos pré-agregados já na carga (os callbacks consultam só os cubos)
+get_cubes()
 # Obtém o último ano disponível
 latest_year = max(df["year"].unique())
 
@@ -254,32 +259,37 @@ layout = dbc.Container(
     ],
 )
 def update_values(select_year, compare_value):
+    return build_overview(select_year, "compare" in compare_value)
 
-    filtered_df = df.copy()
 
-    # filter
+# Resultado memoizado por (ano, comparação) e pela versão de sales.csv
+@memoize(datasets=["sales"])
+def build_overview(select_year, compare):
+
+    # filter (None = todos os anos); os dados vêm dos cubos pré-agregados
+    years = None
     if select_year and select_year != "All":
-        filtered_df = filtered_df[filtered_df["year"] == select_year]
+        years = [select_year]
 
     # cards
     # Contar códigos únicos onde a soma total de qty é maior que 0
-    purchases_card = f"{(filtered_df.groupby('codigo')['qty'].sum() > 0).sum():,.0f}"
-    spend_card = f"$ {round(filtered_df['total'].sum(), -2):,.0f}"
-    category_card = filtered_df.groupby("categoria")["total"].sum().idxmax()
+    purchases_card = f"{(query_cube('codigo', years).groupby('codigo')['qty'].sum() > 0).sum():,.0f}"
+    spend_card = f"$ {round(query_cube('month', years)['total'].sum(), -2):,.0f}"
+    category_card = query_cube("categoria", years).groupby("categoria", observed=True)["total"].sum().idxmax()
 
 
     # sales
     # Obtém os dados do ano selecionado
-    df_selected_year = filtered_df.groupby("month", observed=True)["total"].sum().reset_index()
+    df_selected_year = query_cube("month", years).groupby("month", observed=True)["total"].sum().reset_index()
     df_selected_year["year"] = str(select_year)  # 🔹 Converte ano para string para evitar problemas de mapeamento de cor
 
     # Define prev_year como None inicialmente
     prev_year = None  
 
     # Se a comparação estiver ativada, adiciona os dados do ano anterior
-    if "compare" in compare_value and select_year and select_year != "All":
+    if compare and select_year and select_year != "All":
         prev_year = str(int(select_year) - 1)  # 🔹 Garante que prev_year seja uma string
-        df_prev_year = df[df["year"] == int(prev_year)].groupby("month", observed=True)["total"].sum().reset_index()
+        df_prev_year = query_cube("month", [int(prev_year)]).groupby("month", observed=True)["total"].sum().reset_index()
         df_prev_year["year"] = prev_year  
 
         # Junta os dois DataFrames
@@ -327,17 +337,22 @@ def update_values(select_year, compare_value):
     )
 
 
-    if "compare" in compare_value:  
+    week_df = query_cube("week", years)
+
+    if compare:  
         prev_year = str(int(select_year) - 1)
-        df_prev_year = df[df["year"] == int(prev_year)].copy()
+        df_prev_year = query_cube("week", [int(prev_year)]).copy()
 
         df_prev_year["year"] = prev_year  # Converte para string para diferenciar no gráfico
-        filtered_df["year"] = str(select_year)
+        week_df["year"] = str(select_year)
+
+        week_df = pd.concat([week_df, df_prev_year])  # Junta os dados dos dois anos
 
-        filtered_df = pd.concat([filtered_df, df_prev_year])  # Junta os dados dos dois anos
+        # As seções de categoria abaixo consideram os dois anos
+        years = [select_year, int(prev_year)]
 
     # Agrupa por semana e ano
-    df_grouped = filtered_df.groupby(["week", "year"])["total"].sum().reset_index()
+    df_grouped = week_df.groupby(["week", "year"])["total"].sum().reset_index()
 
     # Define cores fixas
     color_map = {str(select_year): "#1f3990"}
@@ -351,22 +366,23 @@ def update_values(select_year, compare_value):
         y="total",
         color="year",  # Diferencia os anos pela cor
         markers=True,
-        title=f"Vendas Semanais ({select_year}{' vs ' + prev_year if 'compare' in compare_value else ''})",
+        title=f"Vendas Semanais ({select_year}{' vs ' + prev_year if compare else ''})",
         labels={"week": "Semana", "total": "Total de Vendas"},
         color_discrete_map=color_map,  # 🔹 Aplica cores fixas
     ) 
 
     # category   
-    # Verifica se há valores não numéricos na coluna 'total'
-    filtered_df['total'] = filtered_df['total'].fillna(0)
-   
     # Agrupa os dados e calcula o total
-    grouped_df = filtered_df.groupby(
+    grouped_df = query_cube("hierarchy", years).groupby(
         ["categoria", "subcategoria", "cat_nivel3", "cat_nivel4", "cat_nivel5"],
         as_index=False,
         observed=True
     )["total"].sum()
 
+    # O treemap não aceita colunas category; converte apenas o resultado agregado
+    hierarchy = ["categoria", "subcategoria", "cat_nivel3", "cat_nivel4", "cat_nivel5"]
+    grouped_df[hierarchy] = grouped_df[hierarchy].astype(str)
+
     # Calcula o total geral
     total_geral = grouped_df["total"].sum()
 
@@ -394,10 +410,11 @@ def update_values(select_year, compare_value):
     category_chart.update_traces(textfont=dict(size=13))
     category_chart.update_layout(margin=dict(l=35, r=35, t=60, b=35), hovermode=False)
     
-    total_vendas = filtered_df["total"].sum()
+    total_vendas = query_cube("month", years)["total"].sum()
     # Agrupa e seleciona as 10 categorias com maiores vendas
+    cat_nivel3_df = query_cube("cat_nivel3", years)
     top10_maiores_vendas = (
-        filtered_df.groupby("cat_nivel3", as_index=False)["total"]
+        cat_nivel3_df.groupby("cat_nivel3", as_index=False, observed=True)["total"]
         .sum()
         .nlargest(10, "total")
     )
@@ -406,7 +423,7 @@ def update_values(select_year, compare_value):
     
     # Top 10 categorias com menores vendas
     top10_menores_vendas = (
-        filtered_df.groupby("cat_nivel3", as_index=False)["total"]
+        cat_nivel3_df.groupby("cat_nivel3", as_index=False, observed=True)["total"]
         .sum()
         .nsmallest(10, "total")
     )
@@ -441,16 +458,23 @@ def update_daily_sales(select_year, click_data, compare_value):
         return {}, {"display": "none"}  # Oculta o gráfico se nenhum mês for clicado
 
     selected_month = click_data["points"][0]["x"]  # Mês clicado
-    df_filtered = df[df["month"] == selected_month].copy()
+    return build_daily_sales(select_year, selected_month, "compare" in compare_value)
+
+
+# Resultado memoizado por (ano, mês, comparação) e pela versão de sales.csv
+@memoize(datasets=["sales"])
+def build_daily_sales(select_year, selected_month, compare):
+    df_daily = query_cube("daily")  # Totais diários pré-agregados
+    df_filtered = df_daily[df_daily["month"] == selected_month].copy()
 
     prev_year = None  # Inicializa prev_year
 
     if select_year and select_year != "All":
         df_filtered = df_filtered[df_filtered["year"] == select_year]
 
-    if "compare" in compare_value:  
+    if compare:  
         prev_year = str(int(select_year) - 1)
-        df_prev_year = df[(df["month"] == selected_month) & (df["year"] == int(prev_year))].copy()
+        df_prev_year = df_daily[(df_daily["month"] == selected_month) & (df_daily["year"] == int(prev_year))].copy()
 
         df_prev_year["year"] = prev_year  # Ajusta a coluna 'year' para string
         df_filtered["year"] = str(select_year)
@@ -480,7 +504,7 @@ def update_daily_sales(select_year, click_data, compare_value):
         y="total",
         color="year",  # Diferencia os anos pela cor
         markers=True,
-        title=f"Vendas Diárias - {selected_month} ({select_year}{' vs ' + prev_year if 'compare' in compare_value else ''})",
+        title=f"Vendas Diárias - {selected_month} ({select_year}{' vs ' + prev_year if compare else ''})",
         labels={"dia_mes": "Dias do Mês", "total": "Total de Vendas"},
         color_discrete_map=color_map,  # 🔹 Aplica cores fixas
     )
@@ -1,11 +1,14 @@
 import dash
 from dash import callback, dcc, html, Input, Output, dash_table, State
 import dash_bootstrap_components as dbc
-import os
-import xgboost as xgb
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+from utils.cache import memoize
+from utils.data import date_slice, get_dataset
+from utils.forecast import models_version, predict_items
+from utils.forecast_store import lookup_forecasts
+from utils.paging import page_records, table_props
 
 
 dash.register_page(
@@ -20,46 +23,16 @@ import warnings
 warnings.filterwarnings("ignore")
 
 # dataset
-df_proveedor = pd.read_csv(
-    "data/proveedor.csv",
-    usecols=[
-        "proveedor_id",
-        "name",
-    ],
-)
-
-# Remove duplicados com base na coluna 'cod_proveedor', mantendo a última ocorrência
-df_proveedor = df_proveedor.drop_duplicates(subset=['proveedor_id'], keep='last')
+df_proveedor = get_dataset("proveedor", columns=["proveedor_id", "name"])
 
-df_items = pd.read_csv(
-    "data/items.csv",
-    usecols=[
-        "codigo",
-        "descripcion",
-        "proveedor_id",
-    ],
-)
+df_items = get_dataset("items", columns=["codigo", "descripcion", "proveedor_id"])
 
-df_sales = pd.read_csv(
-    "data/sales.csv",
-    usecols=[
-        "date",
-        "codigo",
-        "year",
-        "month",
-        "qty",
-    ],
-)
+df_sales = get_dataset("sales", columns=["date", "codigo", "year", "month", "qty"])
 # Obtém o último ano disponível
-latest_year = max(df_sales["year"].unique())
+latest_year = int(max(df_sales["year"].unique()))
 # Obter o ano atual
 current_year = datetime.now().year
 
-# Filtrar o DataFrame pelo ano anterior (ano atual - 1)
-df_sales = df_sales[df_sales["year"] == current_year - 1]
-df_sales['date'] = pd.to_datetime(df_sales['date'])  # Garantir que a data esteja no formato datetime
-
-
 # Ordena os fornecedores pelo nome
 df_proveedor = df_proveedor.sort_values(by="name")
 
@@ -69,6 +42,22 @@ df_items = df_items.sort_values(by="descripcion")
 # converte o codigo para string
 df_items["codigo"] = df_items["codigo"].astype(str)
 
+
+def prever_itens(codigos, data_inicial, data_final):
+    """Usa as previsões pré-calculadas quando cobrem o período; senão prevê na hora"""
+    future_df = lookup_forecasts(codigos, data_inicial, data_final)
+    if future_df is None:
+        future_df = predict_items(codigos, data_inicial, data_final)
+    return future_df
+
+
+def itens_da_consulta(fornecedor, item):
+    """Itens previstos: todos os do fornecedor (sem item escolhido) ou só o item"""
+    if fornecedor and not item:
+        return df_items[df_items['proveedor_id'] == int(fornecedor)]['codigo'].tolist()
+    return [item]
+
+
 # layout
 layout = dbc.Container(
     [
@@ -177,7 +166,9 @@ layout = dbc.Container(
                 ),                
                 html.Br(),
                 # Div para exibir a previsão de vendas
-                html.Div(id="previsao-output"),                      
+                html.Div(id="previsao-output"),
+                # Consulta da tabela exibida (paginada no servidor)
+                dcc.Store(id="previsao-params"),                      
             ],
             className="page-content",
         )
@@ -187,7 +178,8 @@ layout = dbc.Container(
 
 
 @callback(
-    Output("previsao-output", "children"),        
+    Output("previsao-output", "children"),
+    Output("previsao-params", "data"),
     Input("gerar-previsao-btn", "n_clicks"),  # Somente o botão como Input
     State("proveedor-dropdown", "value"),
     State("item-dropdown", "value"),
@@ -197,16 +189,12 @@ layout = dbc.Container(
 )
 def gerar_previsao(n_clicks, fornecedor, item, data_inicial, data_final):
     if not data_inicial or not data_final:
-        return [html.Div("Selecione um período válido.", style={"color": "red"})]
+        return [html.Div("Selecione um período válido.", style={"color": "red"})], None
 
     # Converter datas para datetime
     data_inicial = pd.to_datetime(data_inicial)
     data_final = pd.to_datetime(data_final)
 
-    # Definir diretório de modelos
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Diretório atual
-    BASE_DIR = os.path.dirname(BASE_DIR)  # Sobe um nível para a raiz
-
     # Se o usuário escolheu um fornecedor mas não escolheu um item
     if fornecedor and not item:
         # Verificar se o fornecedor é válido para conversão
@@ -214,133 +202,33 @@ def gerar_previsao(n_clicks, fornecedor, item, data_inicial, data_final):
             fornecedor = int(fornecedor)
         except (ValueError, TypeError):
             # Caso a conversão falhe, você pode retornar uma mensagem de erro ou um valor padrão
-            return [html.Div("Fornecedor inválido. Por favor, selecione um fornecedor válido.", style={"color": "red"})]
-        
+            return [html.Div("Fornecedor inválido. Por favor, selecione um fornecedor válido.", style={"color": "red"})], None
+
         # Filtrar os itens pertencentes ao fornecedor
-        itens_do_fornecedor = df_items[df_items['proveedor_id'] == fornecedor]['codigo'].tolist()
+        itens_do_fornecedor = itens_da_consulta(fornecedor, item)
 
         if not itens_do_fornecedor:
-            return [html.Div("O fornecedor selecionado não possui produtos com previsão de vendas.", style={"color": "red"})]
+            return [html.Div("O fornecedor selecionado não possui produtos com previsão de vendas.", style={"color": "red"})], None
 
-        todas_as_previsoes = []  # Lista para armazenar previsões de cada item
-        modelos_encontrados = False  # Flag para verificar se encontrou modelos
-
-        # Loop pelos itens do fornecedor
-        for item_codigo in itens_do_fornecedor:
-            modelo_path = os.path.join(BASE_DIR, "modelos", f"modelo_{item_codigo}.json")
-            
-            if os.path.exists(modelo_path):
-                modelos_encontrados = True
-                model = xgb.XGBRegressor()
-                model.load_model(modelo_path)
-
-                # Criar datas futuras
-                future_dates = pd.date_range(start=data_inicial, end=data_final, freq='D')
-                future_df = pd.DataFrame({'ds': future_dates})
-                future_df['year'] = future_df['ds'].dt.year
-                future_df['month'] = future_df['ds'].dt.month
-                future_df['week'] = future_df['ds'].dt.isocalendar().week
-                future_df['is_weekend'] = future_df['ds'].dt.weekday >= 5
-                future_df['is_week_holiday'] = 0
-                future_df['is_week_payday'] = future_df['ds'].dt.day.isin([1, 5, 10, 15, 20, 25])
-                future_df['is_holiday'] = 0
-
-                # Selecionar features para previsão
-                features = ['year', 'month', 'week', 'is_holiday', 'is_weekend', 'is_week_holiday', 'is_week_payday']
-                future_X = future_df[features]
-
-                # Fazer previsão
-                future_df['qty_pred'] = model.predict(future_X)
-                future_df['codigo'] = item_codigo
-
-                # Adicionar dados do item
-                future_df = future_df.merge(df_items[['codigo', 'descripcion', 'proveedor_id']], on='codigo', how='left')
-                # Adicionar nome do fornecedor
-                future_df = future_df.merge(df_proveedor[['proveedor_id', 'name']], on='proveedor_id', how='left')
-
-                # Arredondar valores
-                future_df['qty_pred'] = pd.to_numeric(future_df['qty_pred'], errors='coerce').round(3)
-
-                # Agregar previsões por semana
-                df_semana = future_df.groupby(['week', 'codigo', 'descripcion', 'name']).agg({'qty_pred': 'sum'}).reset_index()
-
-                todas_as_previsoes.append(df_semana)
+        # Previsão de todos os itens do fornecedor em uma única passada
+        resultado_final = forecast_frame(itens_do_fornecedor, data_inicial, data_final, models_version())
 
         # Se nenhum modelo foi encontrado, retornar mensagem
-        if not modelos_encontrados:
-            return [html.Div("O fornecedor selecionado não possui produtos com previsão de vendas.", style={"color": "red"})]
-
-        # Concatenar todas as previsões em um único DataFrame
-        resultado_final = pd.concat(todas_as_previsoes, ignore_index=True)
+        if resultado_final is None:
+            return [html.Div("O fornecedor selecionado não possui produtos com previsão de vendas.", style={"color": "red"})], None
 
     else:  # Se um item foi selecionado
-        modelo_path = os.path.join(BASE_DIR, "modelos", f"modelo_{item}.json")
+        resultado_final = forecast_frame(itens_da_consulta(fornecedor, item), data_inicial, data_final, models_version())
 
-        if not os.path.exists(modelo_path):
-            return [html.Div(f"Modelo para o item {item} não encontrado.", style={"color": "red"})]
+        if resultado_final is None:
+            return [html.Div(f"Modelo para o item {item} não encontrado.", style={"color": "red"})], None
 
-        model = xgb.XGBRegressor()
-        model.load_model(modelo_path)
-
-        # Criar datas futuras
-        future_dates = pd.date_range(start=data_inicial, end=data_final, freq='D')
-        future_df = pd.DataFrame({'ds': future_dates})
-        future_df['year'] = future_df['ds'].dt.year
-        future_df['month'] = future_df['ds'].dt.month
-        future_df['week'] = future_df['ds'].dt.isocalendar().week
-        future_df['is_weekend'] = future_df['ds'].dt.weekday >= 5
-        future_df['is_week_holiday'] = 0
-        future_df['is_week_payday'] = future_df['ds'].dt.day.isin([1, 5, 10, 15, 20, 25])
-        future_df['is_holiday'] = 0
-
-        # Selecionar features para previsão
-        features = ['year', 'month', 'week', 'is_holiday', 'is_weekend', 'is_week_holiday', 'is_week_payday']
-        future_X = future_df[features]
-
-        # Fazer previsão
-        future_df['qty_pred'] = model.predict(future_X)
-        future_df['codigo'] = item
-
-        # Adicionar dados do item
-        future_df = future_df.merge(df_items[['codigo', 'descripcion', 'proveedor_id']], on='codigo', how='left')
-        # Adicionar nome do fornecedor
-        future_df = future_df.merge(df_proveedor[['proveedor_id', 'name']], on='proveedor_id', how='left')
-
-        # Arredondar valores
-        future_df['qty_pred'] = pd.to_numeric(future_df['qty_pred'], errors='coerce').round(3)
-
-        # Agregar previsões por semana
-        resultado_final = future_df.groupby(['week', 'codigo', 'descripcion', 'name']).agg({'qty_pred': 'sum'}).reset_index()
-
-    # Garantir que não existam valores negativos em 'qty_pred'
-    resultado_final['qty_pred'] = resultado_final['qty_pred'].clip(lower=0)
-    
-    # **Adicionando as vendas reais do ano anterior**
-
-    # Ajustar data_inicial e data_final para o ano passado
-    data_inicial_last_year = data_inicial.replace(year=latest_year)
-    data_final_last_year = data_final.replace(year=latest_year)
-
-    # Agora filtrar df_sales com base nas datas ajustadas
-    df_sales_filtered = df_sales[
-        (df_sales['date'] >= data_inicial_last_year) & 
-        (df_sales['date'] <= data_final_last_year)
-    ]
-
-    # Adicionar a coluna de semana em df_sales_filtered
-    df_sales_filtered['week'] = df_sales_filtered['date'].dt.isocalendar().week
-    df_sales_filtered['codigo'] = df_sales_filtered['codigo'].astype(str)
-    df_sales_filtered = df_sales_filtered.groupby(['week', 'codigo']).agg({'qty': 'sum'}).reset_index()
-    
-    # Fazer o merge entre as previsões e as vendas reais do ano anterior
-    resultado_final = resultado_final.merge(
-        df_sales_filtered[['week', 'codigo', 'qty']],  # Garantir que 'vendas_real' existe no df_sales
-        on=['week', 'codigo'], 
-        how='left'
-    )    
+    # Primeira página; as demais (e ordenação/filtro) vêm de update_previsao_table
+    page_data, page_count = page_records(resultado_final)
 
     # Criar tabela Dash com os dados finais
     tabela_dash = dash_table.DataTable(
+        id="previsao-table",
         columns=[
             {"name": "Código", "id": "codigo"},
             {"name": "Descrição", "id": "descripcion"},
@@ -350,7 +238,9 @@ def gerar_previsao(n_clicks, fornecedor, item, data_inicial, data_final):
             {"name": "Último Ano", "id": "qty", "type": "numeric", "format": {"specifier": ".3f"}},
             
         ],
-        data=resultado_final.to_dict("records"),
+        data=page_data,
+        page_count=page_count,
+        **table_props(),
         style_table={'overflowX': 'auto'},
         style_cell={
             "textAlign": "center",
@@ -373,4 +263,84 @@ def gerar_previsao(n_clicks, fornecedor, item, data_inicial, data_final):
         },        
     )
 
-    return [tabela_dash]
+    consulta = {
+        "fornecedor": fornecedor,
+        "item": item,
+        "data_inicial": data_inicial.isoformat(),
+        "data_final": data_final.isoformat(),
+    }
+    return [tabela_dash], consulta
+
+
+@callback(
+    Output("previsao-table", "data"),
+    Output("previsao-table", "page_count"),
+    Input("previsao-table", "page_current"),
+    Input("previsao-table", "page_size"),
+    Input("previsao-table", "sort_by"),
+    Input("previsao-table", "filter_query"),
+    State("previsao-params", "data"),
+    prevent_initial_call=True,  # A primeira página já vem com a tabela
+)
+def update_previsao_table(page_current, page_size, sort_by, filter_query, consulta):
+    if not consulta:
+        return [], 1
+    resultado_final = forecast_frame(
+        itens_da_consulta(consulta["fornecedor"], consulta["item"]),
+        pd.to_datetime(consulta["data_inicial"]),
+        pd.to_datetime(consulta["data_final"]),
+        models_version(),
+    )
+    return page_records(resultado_final, page_current, page_size, sort_by, filter_query)
+
+
+# Resultado memoizado pelos itens, período, datasets e versão dos modelos
+@memoize(datasets=["sales", "items", "proveedor"])
+def forecast_frame(codigos, data_inicial, data_final, versao_modelos):
+    """Previsão semanal por item com as vendas do ano anterior (None se nenhum item tiver modelo)"""
+    future_df = prever_itens(codigos, data_inicial, data_final)
+    if future_df is None:
+        return None
+
+    # Adicionar dados do item
+    future_df = future_df.merge(df_items[['codigo', 'descripcion', 'proveedor_id']], on='codigo', how='left')
+    # Adicionar nome do fornecedor
+    future_df = future_df.merge(df_proveedor[['proveedor_id', 'name']], on='proveedor_id', how='left')
+
+    # Arredondar valores
+    future_df['qty_pred'] = pd.to_numeric(future_df['qty_pred'], errors='coerce').round(3)
+
+    # Agregar previsões por semana, mantendo os itens na ordem em que foram previstos
+    resultado_final = future_df.groupby(['week', 'codigo', 'descripcion', 'name']).agg({'qty_pred': 'sum'}).reset_index()
+    ordem_itens = {codigo: posicao for posicao, codigo in enumerate(pd.unique(future_df['codigo']))}
+    resultado_final = resultado_final.sort_values(
+        'codigo', key=lambda col: col.map(ordem_itens), kind='stable'
+    ).reset_index(drop=True)
+
+    # Garantir que não existam valores negativos em 'qty_pred'
+    resultado_final['qty_pred'] = resultado_final['qty_pred'].clip(lower=0)
+    
+    # **Adicionando as vendas reais do ano anterior**
+
+    # Ajustar data_inicial e data_final para o ano passado
+    data_inicial_last_year = data_inicial.replace(year=latest_year)
+    data_final_last_year = data_final.replace(year=latest_year)
+
+    # Agora filtrar df_sales (ordenado por data) com base nas datas ajustadas
+    df_sales_filtered = date_slice(df_sales, data_inicial_last_year, data_final_last_year)
+    # Só as vendas do ano anterior (ano atual - 1), filtradas no recorte
+    df_sales_filtered = df_sales_filtered[df_sales_filtered["year"] == current_year - 1]
+
+    # Adicionar a coluna de semana em df_sales_filtered
+    df_sales_filtered['week'] = df_sales_filtered['date'].dt.isocalendar().week
+    df_sales_filtered['codigo'] = df_sales_filtered['codigo'].astype(str)
+    df_sales_filtered = df_sales_filtered.groupby(['week', 'codigo']).agg({'qty': 'sum'}).reset_index()
+    
+    # Fazer o merge entre as previsões e as vendas reais do ano anterior
+    resultado_final = resultado_final.merge(
+        df_sales_filtered[['week', 'codigo', 'qty']],  # Garantir que 'vendas_real' existe no df_sales
+        on=['week', 'codigo'], 
+        how='left'
+    )
+
+    return resultado_final
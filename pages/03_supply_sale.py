@@ -5,7 +5,10 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from utils.functions import calculate_abc
+from utils.abc import query_abc, query_supplier_products
+from utils.data import get_dataset
+from utils.cache import memoize
+from utils.paging import page_records, table_props
 from datetime import datetime
 
 
@@ -21,52 +24,33 @@ import warnings
 warnings.filterwarnings("ignore")
 
 # dataset
-df_proveedor = pd.read_csv(
-    "data/proveedor.csv",
-    usecols=[
-        "proveedor_id",
-        "name",
-    ],
-)
-
-# Remove duplicados com base na coluna 'cod_proveedor', mantendo a última ocorrência
-df_proveedor = df_proveedor.drop_duplicates(subset=['proveedor_id'], keep='last')
+df_proveedor = get_dataset("proveedor", columns=["proveedor_id", "name"])
 
-df_item = pd.read_csv(
-    "data/items.csv",
-    usecols=[
-        "codigo",
-        "descripcion",
-    ],
-)
+df_item = get_dataset("items", columns=["codigo", "descripcion"])
 
 df_item = df_item.drop_duplicates(subset=['codigo'])
 
-df_sales = pd.read_csv(
-    "data/sales_proveedor.csv",
-    usecols=[
-        "date",
-        "codigo",
-        "year",
-        "month",
-        "week",
-        "proveedor",
-        "proveedor_id",
-        "categoria",
-        "subcategoria",
-        "cat_nivel3",
-        "total",
-        "qty",
-    ],
-)
+SALES_COLUMNS = [
+    "date",
+    "codigo",
+    "year",
+    "month",
+    "week",
+    "proveedor",
+    "proveedor_id",
+    "categoria",
+    "subcategoria",
+    "cat_nivel3",
+    "total",
+    "qty",
+]
+
+df_sales = get_dataset("sales_proveedor", columns=SALES_COLUMNS)
 # Obtém o último ano disponível
 latest_year = max(df_sales["year"].unique())
 # Obter o ano atual
 current_year = datetime.now().year
 
-# Filtrar o DataFrame pelo ano anterior (ano atual - 1)
-df_sales['date'] = pd.to_datetime(df_sales['date'])  # Garantir que a data esteja no formato datetime
-
 
 # Ordena os fornecedores pelo nome
 df_proveedor = df_proveedor.sort_values(by="name")
@@ -170,7 +154,7 @@ layout = dbc.Container(
                         dbc.Col(
                             dcc.Loading(
                                 html.Div(
-                                    id="abc-table",  # ID da div que conterá a tabela
+                                    id="abc-table-container",  # ID da div que conterá a tabela
                                     className="dash-table-container",
                                     style={
                                         "padding": "20px",
@@ -187,6 +171,10 @@ layout = dbc.Container(
                     ]
                 ),
                 html.Br(),
+                # Período do relatório exibido (usado no detalhe dos produtos)
+                dcc.Store(id="abc-periodo"),
+                # Fornecedor e período da tabela de produtos (paginada no servidor)
+                dcc.Store(id="products-params"),
                 # Modal para exibir os produtos do fornecedor selecionado
                 dbc.Modal(
                     [
@@ -203,7 +191,8 @@ layout = dbc.Container(
                                         {"name": "Subcategoria", "id": "subcategoria"},
                                         {"name": "Total de Vendas", "id": "total_vendas"},
                                         {"name": "Quantidade Vendida", "id": "quantidade_vendida"},
-                                    ],                                    
+                                    ],
+                                    **table_props(),
                                     style_table={"overflowX": "auto"},
                                     style_data_conditional=[
                                         {"if": {"column_id": "codigo"}, "textAlign": "center"},  # Centraliza a coluna "Código"
@@ -254,7 +243,8 @@ layout = dbc.Container(
 @callback(
     [
         Output("abc-chart", "figure"),
-        Output("abc-table", "children"),  # Atualiza o conteúdo da div
+        Output("abc-table-container", "children"),  # Atualiza o conteúdo da div
+        Output("abc-periodo", "data"),
     ],
     [
         Input("gerar-previsao-btn", "n_clicks"),
@@ -271,36 +261,43 @@ def update_dashboard(n_clicks, submit_initial, submit_final, selected_supplier,
     # Verifica se algum dos eventos foi acionado
     ctx = dash.callback_context
     if not ctx.triggered:
-        return {}, []
-
-    trigger_id = ctx.triggered[0]["prop_id"].split(".")[0]
+        return {}, [], None
 
-    # Converte datas para datetime
+    # Converte datas para datetime (forma normalizada usada na chave do cache)
     start_date = pd.to_datetime(start_date)
     end_date = pd.to_datetime(end_date)
 
-    # Filtra os dados pelo período selecionado
-    filtered_df = df_sales[(df_sales["date"] >= start_date) & (df_sales["date"] <= end_date)]
+    abc_chart, table = build_abc_report(start_date, end_date)
+    periodo = {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()}
+    return abc_chart, table, periodo
 
-    # Filtra por fornecedor, se selecionado
-    if selected_supplier:
-        filtered_df = filtered_df[filtered_df["proveedor_id"] == int(selected_supplier)]
 
-    # Calcula a classificação ABC
-    abc_data = calculate_abc(df_sales, start_date, end_date)
+# Classificação completa do período (base da paginação da tabela ABC)
+@memoize(datasets=["sales_proveedor"])
+def abc_report_frame(start_date, end_date):
+    # Calcula a classificação ABC (consultas por período no índice de somas acumuladas)
+    abc_data = query_abc(start_date, end_date)
+    # Adiciona uma coluna com botões na tabela ABC
+    abc_data["view_button"] = "[+]"
+    return abc_data
+
 
-    # Formata os dados para exibição na tabela ABC
-    abc_data_for_table = abc_data.copy()
+def format_abc_page(abc_data_for_table):
+    """Formata só as linhas da página exibida na tabela ABC"""
     abc_data_for_table["total_current"] = abc_data_for_table["total_current"].apply(lambda x: f"₲ {x:,.0f}")  # Formata como moeda Guarani
     abc_data_for_table["total_previous"] = abc_data_for_table["total_previous"].apply(lambda x: f"₲ {x:,.0f}")  # Formata como moeda Guarani
     abc_data_for_table["growth_percentage"] = abc_data_for_table["growth_percentage"].apply(lambda x: f"{x:.2f}%" if x != 0 else "-")
     abc_data_for_table["percentage_of_total"] = abc_data_for_table["percentage_of_total"].apply(lambda x: f"{x:.2f}%")
     abc_data_for_table["cumulative_percentage"] = abc_data_for_table["cumulative_percentage"].apply(lambda x: f"{x:.2f}%")
-    # Adiciona uma coluna com botões na tabela ABC
-    abc_data_for_table["view_button"] = abc_data_for_table.apply(
-        lambda row: f"[+]",  # Cria um link com o nome do fornecedor como identificador
-        axis=1,
-    )
+    return abc_data_for_table
+
+
+# Resultado memoizado pelo período e pela versão de sales_proveedor.csv
+@memoize(datasets=["sales_proveedor"])
+def build_abc_report(start_date, end_date):
+    abc_data = abc_report_frame(start_date, end_date)
+    # Primeira página; as demais (e ordenação/filtro) vêm de update_abc_table
+    page_data, page_count = page_records(abc_data, formatter=format_abc_page)
 
     # Cria a tabela ABC com o estilo personalizado
     table = dash_table.DataTable(
@@ -317,7 +314,9 @@ def update_dashboard(n_clicks, submit_initial, submit_final, selected_supplier,
             {"name": "Classificação", "id": "classificacao"},
             {"name": "Ver", "id": "view_button", "presentation": "markdown"},  # Nova coluna com botões
         ],
-        data=abc_data_for_table.to_dict("records"),
+        data=page_data,
+        page_count=page_count,
+        **table_props(),
         style_table={"overflowX": "auto"},
         # Alinhamento por coluna
         style_data_conditional=[
@@ -387,10 +386,34 @@ def update_dashboard(n_clicks, submit_initial, submit_final, selected_supplier,
         table,  # Retorna a tabela formatada para a div "top10-menores-vendas"
     )
 
+@callback(
+    [
+        Output("abc-table", "data"),
+        Output("abc-table", "page_count"),
+    ],
+    [
+        Input("abc-table", "page_current"),
+        Input("abc-table", "page_size"),
+        Input("abc-table", "sort_by"),
+        Input("abc-table", "filter_query"),
+    ],
+    State("abc-periodo", "data"),  # Período do relatório
+    prevent_initial_call=True,  # A primeira página já vem com a tabela
+)
+def update_abc_table(page_current, page_size, sort_by, filter_query, periodo):
+    if not periodo:
+        return [], 1
+    abc_data = abc_report_frame(pd.to_datetime(periodo["start_date"]), pd.to_datetime(periodo["end_date"]))
+    return page_records(abc_data, page_current, page_size, sort_by, filter_query, format_abc_page)
+
+
 @callback(
     [
         Output("products-modal", "is_open"),  # Controla a visibilidade do modal
-        Output("products-table", "data"),  # Dados da tabela de produtos
+        Output("products-params", "data"),  # Fornecedor e período da tabela de produtos
+        Output("products-table", "page_current"),
+        Output("products-table", "sort_by"),
+        Output("products-table", "filter_query"),
     ],
     [
         Input("abc-table", "active_cell"),  # Detecta cliques nas células da tabela ABC
@@ -398,59 +421,80 @@ def update_dashboard(n_clicks, submit_initial, submit_final, selected_supplier,
     ],
     [
         State("products-modal", "is_open"),  # Estado atual do modal
-        State("abc-table", "data"),  # Dados da tabela ABC
+        State("abc-table", "data"),  # Dados da página exibida da tabela ABC
+        State("abc-periodo", "data"),  # Período do relatório
     ],
 )
-def open_products_modal(active_cell, close_clicks, is_open, abc_table_data):
+def open_products_modal(active_cell, close_clicks, is_open, abc_table_data, periodo):
     ctx = dash.callback_context
+    fechado = (False, None, 0, [], "")
 
     # Verifica qual input disparou o callback
     if not ctx.triggered:
-        return False, []
+        return fechado
 
     trigger_id = ctx.triggered[0]["prop_id"].split(".")[0]
 
     # Fecha o modal se o botão "Fechar" for clicado
     if trigger_id == "close-products-modal":
-        return False, []
+        return fechado
 
     # Verifica se uma célula foi clicada e se é a coluna "Ver"
-    if active_cell and active_cell["column_id"] == "view_button":
+    if active_cell and active_cell["column_id"] == "view_button" and periodo:
         # Obtém o nome do fornecedor clicado
         selected_supplier = abc_table_data[active_cell["row"]]["proveedor"]
 
-        # Filtra os dados dos produtos vendidos pelo fornecedor
-        supplier_products = df_sales[df_sales["proveedor"] == selected_supplier]
-        supplier_products_summary = (
-            supplier_products.groupby(["codigo", "categoria", "subcategoria", "cat_nivel3"])
-            .agg(
-                total_vendas=("total", "sum"),
-                quantidade_vendida=("qty", "sum"),
-            )
-            .reset_index()
-        )
-        
-        # Ordena os produtos pelo total de vendas em ordem decrescente
-        supplier_products_summary = supplier_products_summary.sort_values(by="total_vendas", ascending=False)
-        
-        # Faz o merge com df_item para adicionar a coluna 'descripcion'
-        supplier_products_summary = supplier_products_summary.merge(
-            df_item, on="codigo", how="left"
-        )        
-        
-        # Formata os dados para exibição
-        supplier_products_summary["total_vendas"] = supplier_products_summary["total_vendas"].apply(
-            lambda x: f"₲ {x:,.0f}"
-        )
-        supplier_products_summary["quantidade_vendida"] = supplier_products_summary["quantidade_vendida"].apply(
-            lambda x: f"{x:,}"
-        )
+        # Abre o modal na primeira página dos produtos do fornecedor, no mesmo
+        # período do relatório exibido (dados enviados por update_products_table)
+        return True, {"proveedor": selected_supplier, **periodo}, 0, [], ""
 
-        # Converte os dados para o formato da tabela
-        products_data = supplier_products_summary.to_dict("records")
+    # Caso contrário, mantém o modal fechado
+    return fechado
 
-        # Abre o modal e retorna os dados
-        return True, products_data
 
-    # Caso contrário, mantém o modal fechado
-    return False, []
\ No newline at end of file
+@callback(
+    [
+        Output("products-table", "data"),  # Dados da página exibida
+        Output("products-table", "page_count"),
+    ],
+    [
+        Input("products-params", "data"),
+        Input("products-table", "page_current"),
+        Input("products-table", "page_size"),
+        Input("products-table", "sort_by"),
+        Input("products-table", "filter_query"),
+    ],
+)
+def update_products_table(params, page_current, page_size, sort_by, filter_query):
+    if not params:
+        return [], 1
+    supplier_products_summary = supplier_products_frame(
+        params["proveedor"], pd.to_datetime(params["start_date"]), pd.to_datetime(params["end_date"])
+    )
+    return page_records(supplier_products_summary, page_current, page_size, sort_by, filter_query, format_products_page)
+
+
+# Detalhe memoizado por fornecedor e período
+@memoize(datasets=["sales_proveedor", "items"])
+def supplier_products_frame(selected_supplier, start_date, end_date):
+    # Vendas do fornecedor no período (índice de linhas por fornecedor)
+    supplier_products_summary = query_supplier_products(selected_supplier, start_date, end_date)
+
+    # Ordena os produtos pelo total de vendas em ordem decrescente
+    supplier_products_summary = supplier_products_summary.sort_values(by="total_vendas", ascending=False)
+
+    # Faz o merge com df_item para adicionar a coluna 'descripcion'
+    return supplier_products_summary.merge(
+        df_item, on="codigo", how="left"
+    )
+
+
+def format_products_page(supplier_products_summary):
+    """Formata só as linhas da página exibida na tabela de produtos"""
+    supplier_products_summary["total_vendas"] = supplier_products_summary["total_vendas"].apply(
+        lambda x: f"₲ {x:,.0f}"
+    )
+    supplier_products_summary["quantidade_vendida"] = supplier_products_summary["quantidade_vendida"].apply(
+        lambda x: f"{x:,}"
+    )
+    return supplier_products_summary
@@ -0,0 +1,185 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.data import date_bounds, dataset_version, get_dataset
+from utils.distinct import build_distinct_index, distinct_counts
+from utils.functions import calculate_abc, classify_abc
+
+# Índice da classificação ABC de fornecedores (sales_proveedor.csv), montado uma
+# vez por processo. Com as vendas por dia e por fornecedor acumuladas (somas de
+# prefixo), o total de qualquer período sai de duas linhas da matriz, em vez de
+# filtrar e agrupar todas as transações a cada consulta.
+ABC_COLUMNS = ["date", "codigo", "proveedor_id", "proveedor", "total"]
+
+# Detalhe dos produtos de um fornecedor (modal da tabela ABC): as linhas de
+# cada fornecedor ficam separadas por nome, em ordem de data, e o período é
+# recortado por busca binária antes de agrupar só essas linhas.
+PRODUCT_COLUMNS = ["date", "codigo", "proveedor", "categoria", "subcategoria", "cat_nivel3", "total", "qty"]
+PRODUCT_KEYS = ["codigo", "categoria", "subcategoria", "cat_nivel3"]
+
+_index = None
+_index_version = None
+_products_index = None
+_products_version = None
+_lock = threading.Lock()
+
+
+def build_abc_index(df):
+    """Estruturas do índice: fornecedores, somas de prefixo por dia e itens distintos por dia"""
+    # Vendas sem fornecedor ficam fora, como no groupby de calculate_abc
+    df = df[df["proveedor_id"].notna() & df["proveedor"].notna()]
+    grupos = df.groupby(["proveedor_id", "proveedor"], observed=True)
+    # Fornecedores na mesma ordem do groupby de calculate_abc
+    suppliers = grupos.size().reset_index()[["proveedor_id", "proveedor"]]
+    supplier = grupos.ngroup().to_numpy()
+
+    dates = df["date"].to_numpy()
+    first_day = dates.min() if len(dates) else np.datetime64("1970-01-01", "ns")
+    day = ((dates - first_day) // np.timedelta64(1, "D")).astype(np.int64)
+    n_days = int(day.max()) + 1 if len(day) else 0
+
+    # Somas por dia e fornecedor, acumuladas ao longo dos dias (linha 0 = zero)
+    totals = df["total"].to_numpy(dtype=np.float64)
+    daily = np.zeros((n_days + 1, len(suppliers)), dtype=np.float64)
+    np.add.at(daily, (day + 1, supplier), totals)
+    prefix = np.cumsum(daily, axis=0)
+
+    # Vendas por dia e fornecedor, também acumuladas: o fornecedor entra no período
+    # com qualquer venda, mesmo que só de itens sem código
+    rows = np.zeros((n_days + 1, len(suppliers)), dtype=np.int64)
+    np.add.at(rows, (day + 1, supplier), 1)
+    rows_prefix = np.cumsum(rows, axis=0)
+
+    # Itens vendidos por dia e fornecedor (bitmaps ou HyperLogLog, ver DISTINCT_MODE);
+    # vendas sem código não contam, como no nunique de calculate_abc
+    com_codigo = df["codigo"].notna().to_numpy()
+    distinct = build_distinct_index(
+        supplier[com_codigo],
+        df["codigo"].to_numpy(dtype=np.int64, na_value=0)[com_codigo],
+        day[com_codigo],
+        len(suppliers),
+        n_days,
+    )
+
+    # Somas de prefixo só reproduzem exatamente o groupby().sum() com valores inteiros
+    # (o Guarani não tem centavos); fora disso a consulta usa calculate_abc
+    exact = bool(np.all(totals == np.round(totals))) and float(np.abs(totals).sum()) < 2**53
+
+    return {
+        "first_day": pd.Timestamp(first_day),
+        "n_days": n_days,
+        "suppliers": suppliers,
+        "prefix": prefix,
+        "rows_prefix": rows_prefix,
+        "distinct": distinct,
+        "normalized": bool((df["date"] == df["date"].dt.normalize()).all()),
+        "exact": exact,
+    }
+
+
+def get_abc_index():
+    """Índice do processo, (re)construído quando sales_proveedor.csv muda"""
+    global _index, _index_version
+
+    version = dataset_version("sales_proveedor")
+    if version != _index_version:
+        with _lock:
+            if version != _index_version:
+                _index = build_abc_index(get_dataset("sales_proveedor", columns=ABC_COLUMNS))
+                _index_version = version
+    return _index
+
+
+def clear_indexes():
+    """Descarta os índices ABC e de produtos; a próxima consulta os reconstrói"""
+    global _index, _index_version, _products_index, _products_version
+
+    with _lock:
+        _index = _index_version = _products_index = _products_version = None
+
+
+def _day_range(index, start_date, end_date):
+    """Dias [a, b) do índice cobertos por start_date <= date <= end_date"""
+    a = (pd.Timestamp(start_date).ceil("D") - index["first_day"]).days
+    b = (pd.Timestamp(end_date).floor("D") - index["first_day"]).days + 1
+    return min(max(a, 0), index["n_days"]), min(max(b, 0), index["n_days"])
+
+
+def _range_totals(index, start_date, end_date, key="prefix"):
+    a, b = _day_range(index, start_date, end_date)
+    if b <= a:
+        return np.zeros(len(index["suppliers"]), dtype=index[key].dtype)
+    return index[key][b] - index[key][a]
+
+
+def _range_unique_codes(index, start_date, end_date):
+    a, b = _day_range(index, start_date, end_date)
+    if b <= a or not len(index["suppliers"]):
+        return np.zeros(len(index["suppliers"]), dtype=np.int64)
+    return distinct_counts(index["distinct"], a, b)
+
+
+def query_abc(start_date, end_date):
+    """Classificação ABC do período, igual a calculate_abc sobre sales_proveedor
+
+    Com DISTINCT_MODE=approx, "unique_codes_current" é uma estimativa.
+    """
+    index = get_abc_index()
+    if not index["exact"] or not index["normalized"]:
+        return calculate_abc(get_dataset("sales_proveedor", columns=ABC_COLUMNS), start_date, end_date)
+    return index_abc(index, start_date, end_date)
+
+
+def index_abc(index, start_date, end_date):
+    """Classificação ABC do período a partir de um índice de build_abc_index"""
+    unique_codes = _range_unique_codes(index, start_date, end_date)
+    # Só entram os fornecedores com alguma venda no período atual
+    present = np.flatnonzero(_range_totals(index, start_date, end_date, key="rows_prefix") > 0)
+
+    sales_by_supplier = index["suppliers"].iloc[present].reset_index(drop=True)
+    sales_by_supplier["total_current"] = _range_totals(index, start_date, end_date)[present]
+    sales_by_supplier["unique_codes_current"] = unique_codes[present]
+    sales_by_supplier["total_previous"] = _range_totals(
+        index, start_date - pd.DateOffset(years=1), end_date - pd.DateOffset(years=1)
+    )[present]
+    return classify_abc(sales_by_supplier)
+
+
+def build_products_index(df):
+    """Linhas (posições em df, em ordem de data) e datas das vendas de cada fornecedor"""
+    dates = df["date"].to_numpy()
+    # Posições (em df) das vendas com fornecedor; as demais não entram no detalhe
+    linhas = np.flatnonzero(df["proveedor"].notna().to_numpy())
+    return {
+        proveedor: (linhas[rows], dates[linhas[rows]])
+        for proveedor, rows in df.iloc[linhas].groupby("proveedor", observed=True).indices.items()
+    }
+
+
+def get_products_index():
+    """Índice de linhas por fornecedor, (re)construído quando sales_proveedor.csv muda"""
+    global _products_index, _products_version
+
+    version = dataset_version("sales_proveedor")
+    if version != _products_version:
+        with _lock:
+            if version != _products_version:
+                _products_index = build_products_index(get_dataset("sales_proveedor", columns=PRODUCT_COLUMNS))
+                _products_version = version
+    return _products_index
+
+
+def query_supplier_products(proveedor, start_date, end_date):
+    """Vendas e quantidades por produto do fornecedor entre start_date e end_date, inclusive"""
+    rows, dates = get_products_index().get(
+        proveedor, (np.empty(0, dtype=np.intp), np.empty(0, dtype="datetime64[ns]"))
+    )
+    inicio, fim = date_bounds(dates, start_date, end_date)
+    vendas = get_dataset("sales_proveedor", columns=PRODUCT_COLUMNS).iloc[rows[inicio:fim]]
+    return (
+        vendas.groupby(PRODUCT_KEYS, observed=True)
+        .agg(total_vendas=("total", "sum"), quantidade_vendida=("qty", "sum"))
+        .reset_index()
+    )
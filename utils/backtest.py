@@ -0,0 +1,239 @@
+"""Backtest das previsões contra as vendas reais e tempos de inferência
+
+Repete janelas do histórico de data/sales.csv com os modelos atuais e mede o
+erro (WAPE e MAPE) por item, fornecedor e categoria, além do tempo de carga do
+modelo, montagem das features e predict de cada item. Com --save-predictions /
+--compare serve para conferir que uma otimização não mudou as previsões.
+
+Os modelos normalmente já viram essas janelas no treino; o erro aqui é uma
+referência para comparar versões, não uma estimativa do erro fora da amostra.
+
+Uso:
+    python -m utils.backtest --windows 4 --horizon 28 --output backtest.json
+    python -m utils.backtest --save-predictions ref.parquet
+    python -m utils.backtest --compare ref.parquet
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.features import features_for_dates
+from utils.forecast import FORECAST_MODEL, available_codigos, predict_items
+from utils.global_model import item_attributes
+from utils.models import MODELS_DIR, ModelRegistry
+from utils.training import daily_sales
+
+
+def backtest_windows(last_date, windows, horizon, step=None):
+    """Janelas (início, fim) de `horizon` dias terminando em last_date, da mais antiga à mais recente"""
+    step = step or horizon
+    last_date = pd.Timestamp(last_date).normalize()
+    janelas = []
+    for i in range(windows):
+        fim = last_date - pd.Timedelta(days=i * step)
+        janelas.append((fim - pd.Timedelta(days=horizon - 1), fim))
+    return janelas[::-1]
+
+
+def actual_matrix(daily, codigos, dates):
+    """Vendas reais (itens x dias) dos códigos nas datas informadas, zero sem venda"""
+    posicoes = {codigo: i for i, codigo in enumerate(codigos)}
+    periodo = daily[(daily["date"] >= dates[0]) & (daily["date"] <= dates[-1])]
+    linhas = periodo["codigo"].astype(str).map(posicoes)
+    validos = linhas.notna().to_numpy()
+
+    matrix = np.zeros((len(codigos), len(dates)), dtype=np.float64)
+    colunas = (periodo["date"].to_numpy()[validos] - dates[0].to_datetime64()) // np.timedelta64(1, "D")
+    np.add.at(matrix, (linhas.to_numpy()[validos].astype(np.int64), colunas), periodo["qty"].to_numpy()[validos])
+    return matrix
+
+
+def accuracy(actual, predicted, keys=None):
+    """WAPE e MAPE por linha (ou por grupo de `keys`, somando as linhas dia a dia)
+
+    WAPE = soma |real - previsto| / soma real; MAPE = média de |real - previsto| / real
+    nos dias com venda.
+    """
+    actual = pd.DataFrame(actual)
+    predicted = pd.DataFrame(predicted)
+    if keys is not None:
+        actual = actual.groupby(np.asarray(keys)).sum()
+        predicted = predicted.groupby(np.asarray(keys)).sum()
+    a = actual.to_numpy()
+    erro = np.abs(a - predicted.to_numpy())
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        wape = erro.sum(axis=1) / a.sum(axis=1)
+        relativo = np.where(a > 0, erro / a, 0.0)
+        dias_com_venda = (a > 0).sum(axis=1)
+        # Sem nenhum dia com venda o MAPE fica indefinido (NaN)
+        mape = relativo.sum(axis=1) / np.where(dias_com_venda > 0, dias_com_venda, np.nan)
+    return pd.DataFrame(
+        {"actual": a.sum(axis=1), "predicted": predicted.to_numpy().sum(axis=1), "wape": wape, "mape": mape},
+        index=actual.index,
+    )
+
+
+def _summary(values):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return None
+    return {
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(values.max()),
+    }
+
+
+def time_per_item(codigos, dates, models_dir=MODELS_DIR):
+    """Segundos de carga do modelo e de predict de cada item, e da montagem das features
+
+    Usa um registro novo (cache frio), como no primeiro acesso de um worker.
+    """
+    registry = ModelRegistry(models_dir, check_interval=float("inf"))
+    registry.index()
+
+    inicio = time.perf_counter()
+    X = features_for_dates(dates)
+    features_s = time.perf_counter() - inicio
+
+    load_s, predict_s = [], []
+    for codigo in codigos:
+        inicio = time.perf_counter()
+        model = registry.get(codigo)
+        load_s.append(time.perf_counter() - inicio)
+        inicio = time.perf_counter()
+        model.predict(X)
+        predict_s.append(time.perf_counter() - inicio)
+    return {"features_s": features_s, "load_s": _summary(load_s), "predict_s": _summary(predict_s)}
+
+
+def compare_predictions(predictions, reference_path):
+    """Diferença entre as previsões atuais e as de referência (mesmas janelas e itens)"""
+    reference = pd.read_parquet(reference_path)
+    merged = reference.merge(predictions, on=["window", "codigo", "ds"], how="outer", suffixes=("_ref", ""))
+    faltando = int(merged["qty_pred"].isna().sum() + merged["qty_pred_ref"].isna().sum())
+    diff = np.abs(merged["qty_pred"] - merged["qty_pred_ref"]).dropna()
+    return {
+        "rows": len(merged),
+        "missing": faltando,
+        "max_abs_diff": float(diff.max()) if len(diff) else 0.0,
+        "changed": int((diff > 1e-6).sum()),
+    }
+
+
+def run_backtest(windows=4, horizon=28, step=None, last_date=None, codigos=None, models_dir=MODELS_DIR, daily=None):
+    """Roda o backtest; devolve (resumo, métricas por nível, previsões em formato longo)"""
+    daily = daily if daily is not None else daily_sales()
+    registry = ModelRegistry(models_dir)
+    disponiveis = sorted(available_codigos(registry))
+    if codigos is not None:
+        pedidos = {str(codigo) for codigo in codigos}
+        disponiveis = [codigo for codigo in disponiveis if codigo in pedidos]
+
+    janelas = backtest_windows(last_date or daily["date"].max(), windows, horizon, step)
+    janelas_previstas, previsoes, tempos = [], [], []
+    for numero, (inicio, fim) in enumerate(janelas):
+        t0 = time.perf_counter()
+        future_df = predict_items(disponiveis, inicio, fim, registry=registry)
+        tempos.append(time.perf_counter() - t0)
+        if future_df is None:
+            continue
+        future_df["window"] = numero
+        previsoes.append(future_df[["window", "codigo", "ds", "qty_pred"]])
+
+        dates = pd.date_range(inicio, fim, freq="D")
+        codigos_janela = list(future_df["codigo"].to_numpy()[::len(dates)])
+        previsto = future_df["qty_pred"].to_numpy(dtype=np.float64).reshape(len(codigos_janela), len(dates))
+        janelas_previstas.append((codigos_janela, previsto, actual_matrix(daily, codigos_janela, dates)))
+
+    if not previsoes:
+        raise SystemExit("Nenhum item com modelo para o backtest")
+
+    # Linhas de cada janela alinhadas a uma lista fixa de itens; um item sem
+    # previsão numa janela fica zerado (real e previsto) e não soma erro nela
+    com_previsao = {codigo for codigos_janela, _, _ in janelas_previstas for codigo in codigos_janela}
+    codigos_previstos = [codigo for codigo in disponiveis if codigo in com_previsao]
+    reais, previstos = [], []
+    for codigos_janela, previsto, real in janelas_previstas:
+        linhas = pd.Index(codigos_previstos).get_indexer(codigos_janela)
+        for matriz, destino in ((previsto, previstos), (real, reais)):
+            alinhada = np.zeros((len(codigos_previstos), matriz.shape[1]), dtype=np.float64)
+            alinhada[linhas] = matriz
+            destino.append(alinhada)
+
+    actual = np.hstack(reais)
+    predicted = np.hstack(previstos)
+    attrs = item_attributes().set_index("codigo").reindex(codigos_previstos)
+    niveis = {
+        "item": accuracy(actual, predicted, codigos_previstos),
+        "proveedor": accuracy(actual, predicted, attrs["proveedor_id"].fillna(-1).astype(np.int64)),
+        "categoria": accuracy(actual, predicted, attrs["categoria"].fillna("")),
+    }
+    total = accuracy(actual.sum(axis=0, keepdims=True), predicted.sum(axis=0, keepdims=True)).iloc[0]
+
+    resumo = {
+        "forecast_model": FORECAST_MODEL,
+        "windows": [[inicio.strftime("%Y-%m-%d"), fim.strftime("%Y-%m-%d")] for inicio, fim in janelas],
+        "items": len(codigos_previstos),
+        "total": {"wape": float(total["wape"]), "mape": float(total["mape"])},
+        "accuracy": {
+            nivel: {"groups": len(metricas), "wape": _summary(metricas["wape"]), "mape": _summary(metricas["mape"])}
+            for nivel, metricas in niveis.items()
+        },
+        "timings": {"predict_items_s": _summary(tempos)},
+    }
+    if FORECAST_MODEL == "item":
+        inicio, fim = janelas[-1]
+        resumo["timings"]["per_item"] = time_per_item(
+            codigos_previstos, pd.date_range(inicio, fim, freq="D"), models_dir
+        )
+    return resumo, niveis, pd.concat(previsoes, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest das previsões contra data/sales.csv")
+    parser.add_argument("--windows", type=int, default=4, help="Número de janelas")
+    parser.add_argument("--horizon", type=int, default=28, help="Dias por janela")
+    parser.add_argument("--step", type=int, help="Dias entre o fim de janelas consecutivas (padrão: horizon)")
+    parser.add_argument("--end", help="Último dia da janela mais recente (padrão: última venda)")
+    parser.add_argument("--items", nargs="*", help="Avalia apenas estes códigos")
+    parser.add_argument("--models-dir", default=MODELS_DIR, help="Diretório dos modelos por item")
+    parser.add_argument("--output", help="Grava o resumo em JSON neste arquivo")
+    parser.add_argument("--details", help="Grava as métricas de cada nível em CSV com este prefixo")
+    parser.add_argument("--save-predictions", help="Grava as previsões (parquet) para comparação futura")
+    parser.add_argument("--compare", help="Compara as previsões com as de um parquet gravado antes")
+    args = parser.parse_args()
+
+    resumo, niveis, previsoes = run_backtest(
+        windows=args.windows,
+        horizon=args.horizon,
+        step=args.step,
+        last_date=args.end,
+        codigos=args.items,
+        models_dir=args.models_dir,
+    )
+    if args.compare:
+        resumo["comparison"] = compare_predictions(previsoes, args.compare)
+    if args.save_predictions:
+        previsoes.to_parquet(args.save_predictions, compression="zstd", index=False)
+    if args.details:
+        for nivel, metricas in niveis.items():
+            metricas.rename_axis(nivel).to_csv(f"{args.details}_{nivel}.csv")
+
+    texto = json.dumps(resumo, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(texto)
+    print(texto)
+    if args.compare and (resumo["comparison"]["changed"] or resumo["comparison"]["missing"]):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
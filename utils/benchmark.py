@@ -0,0 +1,283 @@
+"""Benchmark de latência dos callbacks das páginas
+
+Gera dados sintéticos de tamanhos crescentes (utils.synthetic_data) e, para
+cada tamanho, chama diretamente os callbacks das páginas num processo novo,
+medindo tempo (primeira chamada e chamadas repetidas), pico de memória e
+blocos alocados. O resultado vai para um JSON que pode ser comparado com o de
+outro commit.
+
+Uso:
+    python -m utils.benchmark --sizes 500x500 2000x2000 --output bench.json
+    python -m utils.benchmark --sizes 500x500 --compare bench_anterior.json
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from utils.data import BASE_DIR
+
+
+def _measure(func, args, repeats, clear_caches):
+    """Tempo frio (caches limpos), tempos repetidos, pico de memória e blocos alocados"""
+    clear_caches()
+    inicio = time.perf_counter()
+    resultado = func(*args)
+    cold_s = time.perf_counter() - inicio
+
+    tempos = []
+    for _ in range(repeats):
+        inicio = time.perf_counter()
+        func(*args)
+        tempos.append(time.perf_counter() - inicio)
+
+    # Medição de memória separada: o tracemalloc deixa as chamadas bem mais lentas
+    clear_caches()
+    tracemalloc.start()
+    antes = tracemalloc.take_snapshot()
+    func(*args)
+    depois = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocos = sum(stat.count_diff for stat in depois.compare_to(antes, "filename"))
+
+    medicao = {
+        "cold_s": cold_s,
+        "warm_p50_s": float(np.median(tempos)) if tempos else None,
+        "warm_min_s": float(min(tempos)) if tempos else None,
+        "peak_bytes": peak,
+        "net_blocks": blocos,
+    }
+    return medicao, resultado
+
+
+def _trigger(prop_id):
+    # Simula o contexto de uma requisição do Dash para callbacks que leem ctx.triggered
+    from dash._callback_context import context_value
+    from dash._utils import AttributeDict
+
+    context_value.set(AttributeDict(triggered_inputs=[{"prop_id": prop_id, "value": 1}]))
+
+
+def run_callbacks(repeats=5, forecast_days=90):
+    """Executa os callbacks no processo atual (DATA_DIR/MODELS_DIR já apontando para os dados)"""
+    inicio = time.perf_counter()
+    # Registra as páginas e carrega os datasets
+    importlib.import_module("app")
+    from utils.abc import clear_indexes
+    from utils.cubes import clear_cubes
+    from utils.data import get_dataset
+    from utils.features import calendar_features
+    from utils.global_model import get_global_model
+    from utils.models import get_registry
+    import_s = time.perf_counter() - inicio
+
+    dashboard = sys.modules["pages.01_dashboard"]
+    predict = sys.modules["pages.02_predict_sale"]
+    supply = sys.modules["pages.03_supply_sale"]
+
+    def clear_caches():
+        # Resultados memoizados das páginas e estruturas montadas sob demanda
+        # (cubos, índices ABC, modelos, features de calendário); os datasets ficam
+        for module in (dashboard, predict, supply):
+            for value in vars(module).values():
+                if callable(getattr(value, "cache_clear", None)):
+                    value.cache_clear()
+        clear_cubes()
+        clear_indexes()
+        get_registry().clear()
+        get_global_model().clear()
+        calendar_features.cache_clear()
+
+    sales = get_dataset("sales", columns=["date", "year"])
+    ultimo_dia = sales["date"].max()
+    ultimo_ano = int(sales["year"].max())
+    inicio_abc = (ultimo_dia - np.timedelta64(119, "D")).strftime("%Y-%m-%d")
+
+    items = get_dataset("items", columns=["codigo", "proveedor_id"])
+    fornecedor = int(items["proveedor_id"].value_counts().idxmax())
+    item = str(items.loc[items["proveedor_id"] == fornecedor, "codigo"].iloc[0])
+    previsao_inicio = (ultimo_dia + np.timedelta64(1, "D")).strftime("%Y-%m-%d")
+    previsao_fim = (ultimo_dia + np.timedelta64(forecast_days, "D")).strftime("%Y-%m-%d")
+
+    resultados = {}
+
+    def bench(nome, func, *args):
+        resultados[nome], resultado = _measure(func, args, repeats, clear_caches)
+        return resultado
+
+    bench("update_values", dashboard.update_values, ultimo_ano, [])
+    bench("update_values[compare]", dashboard.update_values, ultimo_ano, ["compare"])
+    bench("update_values[All]", dashboard.update_values, "All", [])
+    bench("update_daily_sales", dashboard.update_daily_sales, ultimo_ano, {"points": [{"x": 6}]}, [])
+    bench("update_daily_sales[compare]", dashboard.update_daily_sales, ultimo_ano, {"points": [{"x": 6}]}, ["compare"])
+
+    _trigger("gerar-previsao-btn.n_clicks")
+    _, tabela, periodo = bench(
+        "update_dashboard", supply.update_dashboard, 1, None, None, "", inicio_abc, ultimo_dia.strftime("%Y-%m-%d")
+    )
+
+    ordem = [{"column_id": "total_current", "direction": "asc"}]
+    bench("update_abc_table[sort]", supply.update_abc_table, 1, 25, ordem, "", periodo)
+
+    _trigger("abc-table.active_cell")
+    abc_data = getattr(tabela, "data", None) or []
+    if abc_data:
+        modal = bench(
+            "open_products_modal",
+            supply.open_products_modal,
+            {"row": 0, "column": 9, "column_id": "view_button"},
+            None,
+            False,
+            abc_data,
+            periodo,
+        )
+        bench("update_products_table", supply.update_products_table, modal[1], 0, 25, [], "")
+
+    _, consulta = bench(
+        "gerar_previsao[fornecedor]", predict.gerar_previsao, 1, str(fornecedor), "", previsao_inicio, previsao_fim
+    )
+    if consulta:
+        ordem = [{"column_id": "qty_pred", "direction": "desc"}]
+        bench("update_previsao_table[sort]", predict.update_previsao_table, 1, 25, ordem, "", consulta)
+    bench("gerar_previsao[item]", predict.gerar_previsao, 1, "", item, previsao_inicio, previsao_fim)
+
+    return {"import_s": import_s, "callbacks": resultados}
+
+
+def _prepare(data_dir, skus, daily, years, train):
+    """Gera os dados e (opcionalmente) treina os modelos dos itens do maior fornecedor"""
+    from utils.synthetic_data import generate
+
+    linhas = generate(data_dir, n_skus=skus, n_suppliers=max(10, skus // 20), years=years, daily_transactions=daily)
+    if train:
+        import pandas as pd
+
+        from utils.training import daily_sales, train_all
+
+        items = pd.read_csv(os.path.join(data_dir, "items.csv"))
+        fornecedor = items["proveedor_id"].value_counts().idxmax()
+        codigos = items.loc[items["proveedor_id"] == fornecedor, "codigo"].tolist()
+        vendas = pd.read_csv(os.path.join(data_dir, "sales.csv"), usecols=["date", "codigo", "qty"], parse_dates=["date"])
+        train_all(os.path.join(data_dir, "modelos"), codigos=codigos, daily=daily_sales(vendas), incremental=False)
+    return linhas
+
+
+def _child_env(data_dir):
+    env = dict(os.environ)
+    env.update(
+        {
+            "DATA_DIR": data_dir,
+            "DATA_CACHE_DIR": os.path.join(data_dir, ".cache"),
+            "MODELS_DIR": os.path.join(data_dir, "modelos"),
+            "FORECAST_DIR": os.path.join(data_dir, "previsoes"),
+            "RESULT_CACHE_TYPE": "memory",
+        }
+    )
+    return env
+
+
+def run_size(spec, years, repeats, train, keep):
+    """Gera um tamanho de dados e roda os callbacks num subprocesso com ele"""
+    skus, daily = (int(valor) for valor in spec.lower().split("x"))
+    data_dir = tempfile.mkdtemp(prefix=f"bench_{skus}x{daily}_")
+    try:
+        env = _child_env(data_dir)
+        inicio = time.perf_counter()
+        linhas = subprocess.run(
+            [sys.executable, "-m", "utils.benchmark", "--prepare", data_dir, spec, str(years), str(int(train))],
+            cwd=BASE_DIR, env=env, check=True, capture_output=True, text=True,
+        ).stdout.strip().splitlines()[-1]
+        prepare_s = time.perf_counter() - inicio
+
+        saida = subprocess.run(
+            [sys.executable, "-m", "utils.benchmark", "--child", str(repeats)],
+            cwd=BASE_DIR, env=env, check=True, capture_output=True, text=True,
+        ).stdout.strip().splitlines()[-1]
+        resultado = json.loads(saida)
+        resultado.update({"size": spec, "skus": skus, "daily_transactions": daily, "years": years,
+                          "rows": int(linhas), "prepare_s": prepare_s})
+        return resultado
+    finally:
+        if not keep:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(atual, anterior):
+    """Razão atual/anterior do tempo (warm e cold) e do pico de memória por tamanho e callback"""
+    anteriores = {resultado["size"]: resultado for resultado in anterior["results"]}
+    comparacao = {}
+    for resultado in atual["results"]:
+        base = anteriores.get(resultado["size"])
+        if base is None:
+            continue
+        for nome, medicao in resultado["callbacks"].items():
+            ref = base["callbacks"].get(nome)
+            if ref is None:
+                continue
+            comparacao[f"{resultado['size']} {nome}"] = {
+                metrica: medicao[metrica] / ref[metrica] if ref[metrica] else None
+                for metrica in ("cold_s", "warm_p50_s", "peak_bytes")
+            }
+    return comparacao
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--prepare":
+        data_dir, spec, years, train = sys.argv[2:6]
+        skus, daily = (int(valor) for valor in spec.lower().split("x"))
+        print(_prepare(data_dir, skus, daily, int(years), train == "1"))
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        print(json.dumps(run_callbacks(repeats=int(sys.argv[2]))))
+        return
+
+    parser = argparse.ArgumentParser(description="Benchmark de latência dos callbacks das páginas")
+    parser.add_argument("--sizes", nargs="+", default=["500x500", "2000x2000"], help="Tamanhos SKUSxVENDAS_POR_DIA")
+    parser.add_argument("--years", type=int, default=2, help="Anos de vendas gerados")
+    parser.add_argument("--repeats", type=int, default=5, help="Chamadas repetidas por callback")
+    parser.add_argument("--no-train", action="store_true", help="Não treina modelos (mede só o caminho sem previsão)")
+    parser.add_argument("--keep", action="store_true", help="Mantém os dados gerados")
+    parser.add_argument("--output", help="Grava o resultado em JSON neste arquivo")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    atual = {
+        "commit": _git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "results": [run_size(spec, args.years, args.repeats, not args.no_train, args.keep) for spec in args.sizes],
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            atual["comparison"] = compare_results(atual, json.load(f))
+
+    texto = json.dumps(atual, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(texto)
+    print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from cachelib import BaseCache, FileSystemCache
+
+from utils.data import BASE_DIR, dataset_version
+
+logger = logging.getLogger(__name__)
+
+# Quantidade máxima de resultados guardados por função memoizada
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "64"))
+
+# Cache compartilhado entre os workers do gunicorn (além do LRU local):
+# "memory" (só o LRU do processo), "filesystem" ou "sqlite"
+RESULT_CACHE_TYPE = os.environ.get("RESULT_CACHE_TYPE", "memory")
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR", os.path.join(BASE_DIR, "result_cache"))
+RESULT_CACHE_TIMEOUT = int(os.environ.get("RESULT_CACHE_TIMEOUT", "86400"))
+RESULT_CACHE_THRESHOLD = int(os.environ.get("RESULT_CACHE_THRESHOLD", "2000"))
+
+
+class SQLiteCache(BaseCache):
+    """Cache chave-valor local em SQLite, compartilhado entre processos"""
+
+    def __init__(self, path, default_timeout=300):
+        super().__init__(default_timeout=default_timeout)
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires REAL)"
+            )
+
+    def _connect(self):
+        # Uma conexão por operação: seguro entre threads e após o fork dos workers
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key):
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value FROM cache WHERE key = ? AND (expires = 0 OR expires > ?)",
+                    (key, time.time()),
+                ).fetchone()
+            return pickle.loads(row[0]) if row else None
+        except (sqlite3.Error, pickle.PickleError):
+            logger.exception("Falha ao ler o cache SQLite")
+            return None
+
+    def set(self, key, value, timeout=None):
+        timeout = self._normalize_timeout(timeout)
+        expires = time.time() + timeout if timeout else 0
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM cache WHERE expires != 0 AND expires <= ?", (time.time(),))
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                    (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires),
+                )
+            return True
+        except (sqlite3.Error, pickle.PickleError):
+            logger.exception("Falha ao gravar no cache SQLite")
+            return False
+
+    def delete(self, key):
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount > 0
+
+    def has(self, key):
+        return self.get(key) is not None
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache")
+        return True
+
+
+# Backends disponíveis para o cache compartilhado (nome -> fábrica)
+BACKENDS = {
+    "memory": lambda: None,
+    "filesystem": lambda: FileSystemCache(
+        RESULT_CACHE_DIR, threshold=RESULT_CACHE_THRESHOLD, default_timeout=RESULT_CACHE_TIMEOUT
+    ),
+    "sqlite": lambda: SQLiteCache(
+        os.path.join(RESULT_CACHE_DIR, "results.sqlite3"), default_timeout=RESULT_CACHE_TIMEOUT
+    ),
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def register_backend(name, factory):
+    """Registra um backend extra (fábrica que devolve um cachelib.BaseCache)"""
+    BACKENDS[name] = factory
+
+
+def get_backend():
+    """Backend compartilhado configurado em RESULT_CACHE_TYPE (None = só memória)"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = BACKENDS[RESULT_CACHE_TYPE]() or False
+    return _backend or None
+
+
+def make_key(func, args, kwargs, datasets):
+    """Chave normalizada: nome da função, argumentos e versão dos datasets usados"""
+    versions = [dataset_version(name) for name in datasets]
+    payload = [func.__module__, func.__qualname__, list(args), kwargs, versions]
+    return json.dumps(payload, sort_keys=True, default=str)
+
+
+def memoize(datasets=(), maxsize=None):
+    """Memoiza o resultado de um callback com despejo LRU
+
+    A chave inclui a versão dos arquivos de `datasets`, então alterar os dados
+    invalida os resultados antigos (que saem do cache pelo LRU). Os argumentos
+    devem chegar já normalizados (ex.: datas como Timestamp, flags como bool).
+
+    Em caso de falta no LRU local, consulta o backend compartilhado antes de
+    recalcular, de modo que um resultado calculado por um worker serve os outros.
+    """
+    maxsize = maxsize or RESULT_CACHE_SIZE
+
+    def decorator(func):
+        entries = OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(func, args, kwargs, datasets)
+            with lock:
+                if key in entries:
+                    entries.move_to_end(key)
+                    return entries[key]
+
+            backend = get_backend()
+            shared_key = hashlib.sha1(key.encode()).hexdigest() if backend else None
+            result = backend.get(shared_key) if backend else None
+
+            if result is None:
+                result = func(*args, **kwargs)
+                if backend:
+                    backend.set(shared_key, result)
+
+            with lock:
+                entries[key] = result
+                entries.move_to_end(key)
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+            return result
+
+        wrapper.cache_clear = entries.clear
+        return wrapper
+
+    return decorator
@@ -0,0 +1,59 @@
+import threading
+
+from utils.data import CATEGORY_COLUMNS, dataset_version, get_dataset
+
+# Cubos pré-agregados da tabela de vendas (sales.csv), montados uma vez por
+# processo. Cada cubo soma "total" e "qty" por ano e por uma granularidade de
+# tempo ou de categoria, de modo que os callbacks do dashboard trabalham com
+# poucas linhas em vez de todas as transações.
+CUBES = {
+    "daily": ["year", "month", "date"],
+    "week": ["week", "year"],
+    "month": ["year", "month"],
+    "codigo": ["year", "codigo"],
+    "categoria": ["year", "categoria"],
+    "cat_nivel3": ["year", "cat_nivel3"],
+    "hierarchy": ["year", *CATEGORY_COLUMNS],
+}
+
+_cubes = {}
+_cubes_version = None
+_lock = threading.Lock()
+
+
+def build_cubes(df):
+    """Agrega o DataFrame de vendas em todos os cubos definidos em CUBES"""
+    return {
+        name: df.groupby(keys, observed=True)[["total", "qty"]].sum().reset_index()
+        for name, keys in CUBES.items()
+    }
+
+
+def get_cubes():
+    """Devolve os cubos do processo, (re)construindo-os quando sales.csv muda"""
+    global _cubes, _cubes_version
+
+    version = dataset_version("sales")
+    if version != _cubes_version:
+        with _lock:
+            if version != _cubes_version:
+                columns = sorted({col for keys in CUBES.values() for col in keys} | {"total", "qty"})
+                _cubes = build_cubes(get_dataset("sales", columns=columns))
+                _cubes_version = version
+    return _cubes
+
+
+def clear_cubes():
+    """Descarta os cubos do processo; o próximo get_cubes os reconstrói"""
+    global _cubes, _cubes_version
+
+    with _lock:
+        _cubes, _cubes_version = {}, None
+
+
+def query_cube(name, years=None):
+    """Recorte de um cubo para os anos informados (None = todos os anos)"""
+    cube = get_cubes()[name]
+    if years is not None:
+        cube = cube[cube["year"].isin(years)]
+    return cube
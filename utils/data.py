@@ -0,0 +1,350 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (necessário para o cache em Parquet)
+except ImportError:  # pragma: no cover - sem pyarrow usamos só o CSV
+    pyarrow = None
+
+# Diretório raiz do projeto (um nível acima de utils/)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.environ.get("DATA_DIR", os.path.join(BASE_DIR, "data"))
+
+# Cache colunar (Parquet) gerado automaticamente a partir dos CSVs
+CACHE_DIR = os.environ.get("DATA_CACHE_DIR", os.path.join(DATA_DIR, ".cache"))
+# Incrementar quando o formato do cache mudar (força a reconversão)
+# 2: tabelas de vendas ordenadas por data
+# 3: ids (codigo, proveedor_id) como inteiros anuláveis
+CACHE_VERSION = 3
+
+# DATA_MMAP=1 serve as colunas numéricas das tabelas de vendas a partir de
+# arrays .npy mapeados em memória: todos os workers do gunicorn compartilham as
+# mesmas páginas físicas (page cache do SO) em vez de uma cópia por processo.
+DATA_MMAP = os.environ.get("DATA_MMAP", "0") == "1"
+MMAP_COLUMNS = ["date", "codigo", "year", "month", "week", "total", "qty", "proveedor_id"]
+
+# Colunas de categoria usadas pelas páginas (armazenadas como category)
+CATEGORY_COLUMNS = ["categoria", "subcategoria", "cat_nivel3", "cat_nivel4", "cat_nivel5"]
+
+# Definição de cada dataset: arquivo de origem, colunas (união dos usecols
+# de todas as páginas), tipos e a coluna pela qual as linhas ficam ordenadas.
+# Os ids são inteiros anuláveis (Int64/Int32): um id em branco no CSV vira <NA>
+# em vez de impedir a carga do dataset inteiro.
+DATASETS = {
+    "sales": {
+        "file": "sales.csv",
+        "usecols": ["date", "codigo", "year", "month", "week", *CATEGORY_COLUMNS, "total", "qty"],
+        "dtype": {
+            "codigo": "Int64",
+            "year": "int16",
+            "month": "int8",
+            "week": "int8",
+            **{col: "category" for col in CATEGORY_COLUMNS},
+            "total": "float64",
+            "qty": "float64",
+        },
+        "parse_dates": ["date"],
+        "sort_by": "date",
+        "mmap": True,
+    },
+    "sales_proveedor": {
+        "file": "sales_proveedor.csv",
+        "usecols": [
+            "date",
+            "codigo",
+            "year",
+            "month",
+            "week",
+            "proveedor",
+            "proveedor_id",
+            "categoria",
+            "subcategoria",
+            "cat_nivel3",
+            "total",
+            "qty",
+        ],
+        "dtype": {
+            "codigo": "Int64",
+            "year": "int16",
+            "month": "int8",
+            "week": "int8",
+            "proveedor": "category",
+            "proveedor_id": "Int32",
+            "categoria": "category",
+            "subcategoria": "category",
+            "cat_nivel3": "category",
+            "total": "float64",
+            "qty": "float64",
+        },
+        "parse_dates": ["date"],
+        "sort_by": "date",
+        "mmap": True,
+    },
+    "items": {
+        "file": "items.csv",
+        "usecols": ["codigo", "descripcion", "proveedor_id"],
+        "dtype": {"codigo": "Int64", "proveedor_id": "Int32"},
+    },
+    "proveedor": {
+        "file": "proveedor.csv",
+        "usecols": ["proveedor_id", "name"],
+        "dtype": {"proveedor_id": "Int32"},
+    },
+}
+
+# Cache em memória dos datasets já carregados (um por processo/worker) e a
+# versão do arquivo de origem usada em cada carga
+_frames = {}
+_versions = {}
+_lock = threading.Lock()
+
+
+def _source_path(name):
+    return os.path.join(DATA_DIR, DATASETS[name]["file"])
+
+
+def _file_version(name):
+    stat = os.stat(_source_path(name))
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def _file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_csv(name):
+    spec = DATASETS[name]
+    df = pd.read_csv(
+        _source_path(name),
+        usecols=spec["usecols"],
+        dtype=spec.get("dtype"),
+        parse_dates=spec.get("parse_dates", False),
+    )
+
+    if name == "proveedor":
+        # Remove duplicados com base na coluna 'proveedor_id', mantendo a última ocorrência
+        df = df.drop_duplicates(subset=["proveedor_id"], keep="last").reset_index(drop=True)
+
+    if spec.get("sort_by"):
+        # Ordenação estável: linhas do mesmo dia mantêm a ordem do CSV
+        df = df.sort_values(spec["sort_by"], kind="stable").reset_index(drop=True)
+
+    return df
+
+
+def _columnar_cache(name):
+    """Garante o cache Parquet do dataset e devolve o caminho (ou None sem pyarrow)
+
+    O cache é válido enquanto tamanho e mtime do CSV forem os do manifesto. Se só
+    o mtime mudou (ex.: arquivo copiado num deploy), compara o hash do conteúdo
+    antes de reconverter.
+    """
+    if pyarrow is None:
+        return None
+
+    source = _source_path(name)
+    parquet_path = os.path.join(CACHE_DIR, f"{name}.parquet")
+    manifest_path = os.path.join(CACHE_DIR, f"{name}.json")
+
+    stat = os.stat(source)
+    manifest = {}
+    if os.path.exists(manifest_path) and os.path.exists(parquet_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    if manifest.get("version") == CACHE_VERSION and manifest.get("size") == stat.st_size:
+        if manifest.get("mtime_ns") == stat.st_mtime_ns:
+            return parquet_path
+        if manifest.get("sha1") == _file_hash(source):
+            manifest["mtime_ns"] = stat.st_mtime_ns
+            _write_json_atomic(manifest_path, manifest)
+            return parquet_path
+
+    # Converte o CSV (arquivo temporário + os.replace para não expor um cache pela metade)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    sha1 = _file_hash(source)
+    df = _read_csv(name)
+    tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+    df.to_parquet(tmp_path, engine="pyarrow", compression="zstd", index=False)
+    os.replace(tmp_path, parquet_path)
+    _write_json_atomic(
+        manifest_path,
+        {"version": CACHE_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha1": sha1},
+    )
+    return parquet_path
+
+
+def _array_cache(name, parquet_path):
+    """Garante os arrays .npy das colunas numéricas (mesma versão do cache Parquet)"""
+    array_dir = os.path.join(CACHE_DIR, f"{name}.arrays")
+    manifest_path = os.path.join(array_dir, "manifest.json")
+
+    with open(os.path.join(CACHE_DIR, f"{name}.json")) as f:
+        sha1 = json.load(f)["sha1"]
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") == CACHE_VERSION and manifest.get("sha1") == sha1:
+            return array_dir
+
+    columns = [col for col in MMAP_COLUMNS if col in DATASETS[name]["usecols"]]
+    df = pd.read_parquet(parquet_path, columns=columns)
+    os.makedirs(array_dir, exist_ok=True)
+    for col in columns:
+        arrays = {col: df[col].to_numpy()}
+        mask_path = os.path.join(array_dir, f"{col}.mask.npy")
+        dtype = df[col].dtype
+        if pd.api.types.is_extension_array_dtype(dtype) and pd.api.types.is_integer_dtype(dtype):
+            # Inteiro anulável: valores (0 onde ausente) e máscara dos ausentes
+            arrays = {
+                col: df[col].to_numpy(dtype=dtype.numpy_dtype, na_value=0),
+                f"{col}.mask": df[col].isna().to_numpy(),
+            }
+        elif os.path.exists(mask_path):
+            os.remove(mask_path)
+        for arquivo, valores in arrays.items():
+            tmp_path = os.path.join(array_dir, f"{arquivo}.{os.getpid()}.tmp.npy")
+            np.save(tmp_path, valores)
+            os.replace(tmp_path, os.path.join(array_dir, f"{arquivo}.npy"))
+    _write_json_atomic(manifest_path, {"version": CACHE_VERSION, "sha1": sha1})
+    return array_dir
+
+
+def _load_array(array_dir, col):
+    """Coluna mapeada em memória; inteiros anuláveis vêm com a máscara de ausentes"""
+    values = np.load(os.path.join(array_dir, f"{col}.npy"), mmap_mode="r")
+    mask_path = os.path.join(array_dir, f"{col}.mask.npy")
+    if not os.path.exists(mask_path):
+        return values
+    return pd.arrays.IntegerArray(values, np.load(mask_path, mmap_mode="r"))
+
+
+def _read_columns(name, columns):
+    parquet_path = _columnar_cache(name)
+    if parquet_path is None:
+        return _read_csv(name)
+
+    mmap_columns = []
+    if DATA_MMAP and DATASETS[name].get("mmap"):
+        mmap_columns = [col for col in columns if col in MMAP_COLUMNS]
+    if not mmap_columns:
+        return pd.read_parquet(parquet_path, columns=columns)
+
+    # Colunas numéricas vêm dos arrays mapeados (sem cópia); as demais do Parquet
+    array_dir = _array_cache(name, parquet_path)
+    other_columns = [col for col in columns if col not in mmap_columns]
+    data = {col: _load_array(array_dir, col) for col in mmap_columns}
+    if other_columns:
+        data.update(pd.read_parquet(parquet_path, columns=other_columns).items())
+    return pd.DataFrame({col: data[col] for col in columns}, copy=False)
+
+
+def _ensure_columns(name, columns):
+    """Carrega (uma vez por processo) as colunas ainda não lidas do dataset"""
+    frame = _frames.get(name)
+    missing = [col for col in columns if frame is None or col not in frame.columns]
+    if not missing:
+        return frame
+
+    with _lock:
+        frame = _frames.get(name)
+        missing = [col for col in columns if frame is None or col not in frame.columns]
+        if missing:
+            if frame is None:
+                _versions[name] = _file_version(name)
+            loaded = _read_columns(name, missing)
+            if frame is None:
+                frame = loaded
+            else:
+                frame = pd.concat([frame, loaded[missing]], axis=1)
+            _frames[name] = frame
+    return frame
+
+
+def dataset_version(name):
+    """Versão (tamanho + mtime) do arquivo de origem dos dados em memória
+
+    Com o dataset já carregado, é a versão lida na carga: as páginas guardam as
+    tabelas de get_dataset desde a importação, então um CSV novo só entra em uso
+    depois de reiniciar os workers. Antes da carga, é a versão atual do arquivo.
+    """
+    version = _versions.get(name)
+    return version if version is not None else _file_version(name)
+
+
+def load_dataset(name):
+    """Carrega o dataset uma única vez por processo e devolve a tabela compartilhada"""
+    return _ensure_columns(name, DATASETS[name]["usecols"])
+
+
+def get_dataset(name, columns=None):
+    """Devolve uma view somente leitura do dataset (apenas as colunas pedidas)
+
+    Só as colunas pedidas são lidas do cache colunar. Com copy-on-write ativo
+    (ligado pelo app.py) a view não copia os dados; qualquer alteração feita pela página fica no próprio
+    recorte e não afeta os outros usuários da tabela.
+    """
+    if columns is None:
+        return load_dataset(name).copy(deep=False)
+    columns = list(columns)
+    return _ensure_columns(name, columns)[columns]
+
+
+def date_bounds(dates, start_date, end_date):
+    """Posições [inicio, fim) de start_date <= date <= end_date num array de datas ordenado"""
+    inicio = np.searchsorted(dates, pd.Timestamp(start_date).to_datetime64(), side="left")
+    fim = np.searchsorted(dates, pd.Timestamp(end_date).to_datetime64(), side="right")
+    return inicio, max(inicio, fim)
+
+
+def _sorted_store_view(dates):
+    """Se `dates` é um trecho contíguo da coluna de datas de um dataset ordenado por data
+
+    Os datasets com sort_by="date" são ordenados na carga; uma view contígua
+    (seleção de colunas ou iloc com passo 1) de um deles continua ordenada.
+    Cópias (filtros por máscara, sort_values, merge) não compartilham memória.
+    """
+    if dates.ndim != 1 or dates.strides[0] != dates.itemsize:
+        return False
+    for name, frame in list(_frames.items()):
+        if DATASETS[name].get("sort_by") == "date" and np.may_share_memory(dates, frame["date"].to_numpy()):
+            return True
+    return False
+
+
+def date_slice(df, start_date, end_date):
+    """Linhas com start_date <= date <= end_date
+
+    Em recortes das tabelas ordenadas por data de get_dataset, duas buscas
+    binárias em vez de comparar a coluna inteira; o recorte é uma view (sem
+    cópia), com os mesmos rótulos de índice do filtro por máscara. Nas demais
+    tabelas (ordem desconhecida), usa a máscara.
+    """
+    dates = df["date"].to_numpy()
+    if not _sorted_store_view(dates):
+        return df[(df["date"] >= start_date) & (df["date"] <= end_date)]
+    inicio, fim = date_bounds(dates, start_date, end_date)
+    return df.iloc[inicio:fim]
+
+
+def get_date_range(name, start_date, end_date, columns=None):
+    """Recorte do dataset (ordenado por data) entre start_date e end_date, inclusive"""
+    inicio, fim = date_bounds(_ensure_columns(name, ["date"])["date"].to_numpy(), start_date, end_date)
+    return get_dataset(name, columns).iloc[inicio:fim]
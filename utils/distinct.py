@@ -0,0 +1,200 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Contagem de itens distintos por grupo (ex.: fornecedor) em qualquer período.
+# As estruturas guardam, para cada dia e grupo, o conjunto de itens vendidos;
+# um período é a união (OR dos bitmaps ou máximo dos registradores) dos dias.
+#   "exact":  bitmap dos itens de cada grupo (um bit por item do grupo)
+#   "approx": registradores HyperLogLog (tamanho fixo por grupo, erro ~1.04/sqrt(m)),
+#             guardados só para os pares (dia, grupo) com venda
+DISTINCT_MODE = os.environ.get("DISTINCT_MODE", "exact")
+# m = 2**HLL_PRECISION registradores por grupo e dia no modo aproximado
+HLL_PRECISION = int(os.environ.get("HLL_PRECISION", "8"))
+# Dias pré-combinados por bloco: um período combina no máximo
+# 2 * BLOCK_DAYS dias avulsos mais os blocos inteiros do meio
+BLOCK_DAYS = 32
+
+
+def _blocks(rows, reduce):
+    if not len(rows):
+        return rows[:0]
+    return reduce.reduceat(rows, np.arange(0, len(rows), BLOCK_DAYS), axis=0)
+
+
+def _merge_range(index, a, b):
+    """União dos dias [a, b) dos bitmaps combinando blocos inteiros e as pontas dia a dia"""
+    rows, blocks, reduce = index["rows"], index["blocks"], index["reduce"]
+    first_block = -(-a // BLOCK_DAYS)
+    last_block = b // BLOCK_DAYS
+    if first_block >= last_block:
+        partes = rows[a:b]
+    else:
+        partes = np.concatenate(
+            [rows[a:first_block * BLOCK_DAYS], blocks[first_block:last_block], rows[last_block * BLOCK_DAYS:b]]
+        )
+    if not len(partes):
+        return np.zeros(rows.shape[1:], dtype=rows.dtype)
+    return reduce.reduce(partes, axis=0)
+
+
+def build_bitmaps(group, item, day, n_groups, n_days):
+    """Bitmaps (dias x palavras de 64 bits); cada grupo ocupa as palavras dos seus itens"""
+    pares = pd.DataFrame({"group": group, "item": item}).drop_duplicates().sort_values(["group", "item"])
+    local = pares.groupby("group").cumcount().to_numpy()
+    n_items = np.bincount(pares["group"].to_numpy(), minlength=n_groups)
+    words = np.maximum(1, -(-n_items // 64))
+    offsets = np.concatenate([[0], np.cumsum(words)])
+
+    # Posição (palavra, bit) de cada venda a partir do número local do item no grupo
+    posicao = pd.Series(
+        np.arange(len(pares)), index=pd.MultiIndex.from_arrays([pares["group"].to_numpy(), pares["item"].to_numpy()])
+    )
+    linha = posicao.reindex(pd.MultiIndex.from_arrays([group, item])).to_numpy()
+    coluna = offsets[group] + local[linha] // 64
+    bit = np.left_shift(np.uint64(1), (local[linha] % 64).astype(np.uint64))
+
+    rows = np.zeros((n_days, offsets[-1]), dtype=np.uint64)
+    np.bitwise_or.at(rows, (day, coluna), bit)
+    return {
+        "mode": "exact",
+        "rows": rows,
+        "blocks": _blocks(rows, np.bitwise_or),
+        "reduce": np.bitwise_or,
+        "offsets": offsets,
+    }
+
+
+def _hash64(values):
+    """splitmix64: espalha os códigos inteiros nos 64 bits"""
+    with np.errstate(over="ignore"):
+        z = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def _bit_length(values):
+    n = np.zeros(values.shape, dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        acima = values >= (np.uint64(1) << np.uint64(shift))
+        values = np.where(acima, values >> np.uint64(shift), values)
+        n += acima.astype(np.uint8) * shift
+    return n + (values > 0)
+
+
+def _block_cells(chave, registers, n_groups, n_blocks):
+    """Combina (máximo) os registradores com a mesma chave bloco * n_groups + grupo
+
+    Devolve as células ordenadas por bloco, o grupo de cada uma e o ponteiro do
+    início de cada bloco (n_blocks + 1 posições).
+    """
+    ordem = np.argsort(chave, kind="stable")
+    chave = chave[ordem]
+    inicios = np.flatnonzero(np.r_[True, chave[1:] != chave[:-1]]) if len(chave) else np.empty(0, dtype=np.intp)
+    cells = np.maximum.reduceat(registers[ordem], inicios, axis=0) if len(inicios) else registers[:0]
+    chave = chave[inicios]
+    ptr = np.searchsorted(chave // n_groups, np.arange(n_blocks + 1))
+    return cells, chave % n_groups, ptr
+
+
+def build_hll(group, item, day, n_groups, n_days, precision=HLL_PRECISION):
+    """Registradores HyperLogLog só das células (dia, grupo) com venda, por dia e por bloco"""
+    h = _hash64(np.asarray(item))
+    resto_bits = 64 - precision
+    registro = (h >> np.uint64(resto_bits)).astype(np.int64)
+    resto = h & np.uint64((1 << resto_bits) - 1)
+    rho = (resto_bits - _bit_length(resto) + 1).astype(np.uint8)
+
+    # Uma linha de registradores por célula (dia, grupo) com venda, em ordem de dia
+    chaves, celula = np.unique(
+        np.asarray(day, dtype=np.int64) * n_groups + np.asarray(group, dtype=np.int64), return_inverse=True
+    )
+    cells = np.zeros((len(chaves), 1 << precision), dtype=np.uint8)
+    np.maximum.at(cells, (celula, registro), rho)
+    cell_group = chaves % n_groups
+    day_ptr = np.searchsorted(chaves // n_groups, np.arange(n_days + 1))
+
+    # Blocos de BLOCK_DAYS dias a partir das células diárias
+    n_blocks = -(-n_days // BLOCK_DAYS)
+    cell_day = np.repeat(np.arange(n_days), np.diff(day_ptr))
+    blocks, block_group, block_ptr = _block_cells(
+        cell_day // BLOCK_DAYS * n_groups + cell_group, cells, n_groups, n_blocks
+    )
+    return {
+        "mode": "approx",
+        "n_groups": n_groups,
+        "cells": cells,
+        "cell_group": cell_group,
+        "day_ptr": day_ptr,
+        "blocks": blocks,
+        "block_group": block_group,
+        "block_ptr": block_ptr,
+        "precision": precision,
+    }
+
+
+def _merge_hll(index, a, b):
+    """Registradores (grupos x m) da união dos dias [a, b)"""
+    first_block = -(-a // BLOCK_DAYS)
+    last_block = b // BLOCK_DAYS
+    day_ptr, block_ptr = index["day_ptr"], index["block_ptr"]
+    if first_block >= last_block:
+        fatias = [("cells", "cell_group", day_ptr[a], day_ptr[b])]
+    else:
+        fatias = [
+            ("cells", "cell_group", day_ptr[a], day_ptr[first_block * BLOCK_DAYS]),
+            ("blocks", "block_group", block_ptr[first_block], block_ptr[last_block]),
+            ("cells", "cell_group", day_ptr[last_block * BLOCK_DAYS], day_ptr[b]),
+        ]
+    registers = np.concatenate([index[regs][i:j] for regs, _, i, j in fatias])
+    groups = np.concatenate([index[grupo][i:j] for _, grupo, i, j in fatias])
+
+    merged = np.zeros((index["n_groups"], 1 << index["precision"]), dtype=np.uint8)
+    if len(groups):
+        ordem = np.argsort(groups, kind="stable")
+        groups = groups[ordem]
+        inicios = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        merged[groups[inicios]] = np.maximum.reduceat(registers[ordem], inicios, axis=0)
+    return merged
+
+
+def build_distinct_index(group, item, day, n_groups, n_days, mode=None):
+    """Estrutura de contagem distinta por grupo e dia (group e day já numerados a partir de 0)"""
+    vendas = pd.DataFrame({"group": group, "item": item, "day": day}).drop_duplicates()
+    args = (vendas["group"].to_numpy(), vendas["item"].to_numpy(), vendas["day"].to_numpy(), n_groups, n_days)
+    if (mode or DISTINCT_MODE) == "approx":
+        return build_hll(*args)
+    return build_bitmaps(*args)
+
+
+def _hll_estimate(registers):
+    m = registers.shape[-1]
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+    estimativa = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis=-1)
+    zeros = np.sum(registers == 0, axis=-1)
+    # Correção para cardinalidades pequenas (contagem linear)
+    with np.errstate(divide="ignore"):
+        linear = m * np.log(m / zeros)
+    estimativa = np.where((estimativa <= 2.5 * m) & (zeros > 0), linear, estimativa)
+    # Grupo com venda no período conta ao menos 1; sem venda, todos os registradores são 0
+    return np.where(zeros < m, np.maximum(1, np.rint(estimativa)), 0).astype(np.int64)
+
+
+_POPCOUNT_TABLE = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+
+def _popcount(words):
+    """Bits ligados em cada palavra de 64 bits (np.bitwise_count só existe no numpy >= 2)"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).astype(np.int64)
+    por_byte = _POPCOUNT_TABLE[np.ascontiguousarray(words).view(np.uint8)]
+    return por_byte.reshape(*words.shape, 8).sum(axis=-1, dtype=np.int64)
+
+
+def distinct_counts(index, a, b):
+    """Itens distintos de cada grupo nos dias [a, b)"""
+    if index["mode"] == "approx":
+        return _hll_estimate(_merge_hll(index, a, b))
+    return np.add.reduceat(_popcount(_merge_range(index, a, b)), index["offsets"][:-1])
@@ -0,0 +1,58 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+from utils.holidays import holiday_flags
+
+# Features de calendário usadas pelos modelos por item (mesma ordem do treino)
+FEATURES = ['year', 'month', 'week', 'is_holiday', 'is_weekend', 'is_week_holiday', 'is_week_payday']
+# Incrementar quando o cálculo das features mudar (invalida previsões pré-calculadas)
+FEATURES_VERSION = 2
+
+# Dias do mês considerados dia de pagamento
+PAYDAYS = [1, 5, 10, 15, 20, 25]
+
+
+def features_for_dates(dates):
+    """Matriz float32 (um dia por linha, colunas em FEATURES) para as datas informadas
+
+    float32 é o tipo que o XGBoost usa internamente, então a matriz vai direto
+    para o predict sem conversão.
+    """
+    dates = pd.DatetimeIndex(dates)
+    X = np.zeros((len(dates), len(FEATURES)), dtype=np.float32)
+    X[:, FEATURES.index('year')] = dates.year
+    X[:, FEATURES.index('month')] = dates.month
+    X[:, FEATURES.index('week')] = dates.isocalendar().week.to_numpy(dtype=np.int64)
+    X[:, FEATURES.index('is_weekend')] = dates.weekday >= 5
+    X[:, FEATURES.index('is_week_payday')] = np.isin(dates.day, PAYDAYS)
+    # Feriados vêm da tabela pré-calculada do calendário (nacionais + eventos locais)
+    is_holiday, is_week_holiday = holiday_flags(dates)
+    X[:, FEATURES.index('is_holiday')] = is_holiday
+    X[:, FEATURES.index('is_week_holiday')] = is_week_holiday
+    return X
+
+
+@functools.lru_cache(maxsize=256)
+def _calendar_features(start, end):
+    dates = pd.date_range(start=start, end=end, freq='D')
+    X = features_for_dates(dates)
+    X.flags.writeable = False
+    return dates, X
+
+
+def calendar_features(data_inicial, data_final):
+    """Datas e matriz de features do período, memoizadas por (início, fim)
+
+    A matriz é somente leitura, pois é compartilhada entre requisições.
+    """
+    return _calendar_features(pd.Timestamp(data_inicial), pd.Timestamp(data_final))
+
+
+calendar_features.cache_clear = _calendar_features.cache_clear
+
+
+def week_of(X):
+    """Coluna 'week' da matriz de features como inteiros"""
+    return X[:, FEATURES.index('week')].astype(np.int64)
@@ -0,0 +1,119 @@
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from utils.features import calendar_features, week_of
+from utils.global_model import get_global_model
+from utils.models import get_registry
+
+# Tipo de modelo da instalação: "item" (um modelo por item em modelos/) ou
+# "global" (um único modelo para todos os itens em modelo_global/)
+FORECAST_MODEL = os.environ.get("FORECAST_MODEL", "item")
+
+# Inferência paralela: threads do pool compartilhado pelo processo (o XGBoost
+# libera o GIL durante o predict), itens por tarefa e máximo de tarefas em
+# andamento por requisição, para que uma previsão grande não ocupe o pool todo.
+PREDICT_WORKERS = int(os.environ.get("PREDICT_WORKERS", str(min(4, os.cpu_count() or 1))))
+PREDICT_CHUNK_SIZE = int(os.environ.get("PREDICT_CHUNK_SIZE", "32"))
+PREDICT_MAX_INFLIGHT = int(os.environ.get("PREDICT_MAX_INFLIGHT", str(max(1, PREDICT_WORKERS // 2))))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Pool de threads de inferência (criado no primeiro uso, após o fork dos workers)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=PREDICT_WORKERS, thread_name_prefix="predict")
+    return _executor
+
+
+def _predict_chunk(registry, codigos, future_X):
+    resultados = []
+    for codigo in codigos:
+        model = registry.get(codigo)
+        if model is not None:
+            resultados.append((codigo, model.predict(future_X)))
+    return resultados
+
+
+def _predict_parallel(registry, codigos, future_X):
+    """Distribui os itens em lotes no pool, com no máximo PREDICT_MAX_INFLIGHT por vez"""
+    chunks = [codigos[i:i + PREDICT_CHUNK_SIZE] for i in range(0, len(codigos), PREDICT_CHUNK_SIZE)]
+    if PREDICT_WORKERS <= 1 or len(chunks) <= 1:
+        return [resultado for chunk in chunks for resultado in _predict_chunk(registry, chunk, future_X)]
+
+    executor = get_executor()
+    resultados = [None] * len(chunks)
+    pendentes = {}
+    proximo = 0
+    while proximo < len(chunks) or pendentes:
+        while proximo < len(chunks) and len(pendentes) < PREDICT_MAX_INFLIGHT:
+            pendentes[executor.submit(_predict_chunk, registry, chunks[proximo], future_X)] = proximo
+            proximo += 1
+        concluidos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+        for future in concluidos:
+            resultados[pendentes.pop(future)] = future.result()
+
+    return [resultado for lote in resultados for resultado in lote]
+
+
+def available_codigos(registry=None):
+    """Códigos dos itens que têm previsão no tipo de modelo configurado"""
+    if FORECAST_MODEL == "global":
+        return get_global_model().codigos()
+    return list((registry or get_registry()).index())
+
+
+def models_version(registry=None):
+    """Versão dos modelos em uso (muda com qualquer modelo gravado, sobrescrito ou removido)"""
+    if FORECAST_MODEL == "global":
+        return get_global_model().version()
+    return (registry or get_registry()).version()
+
+
+def predict_items(codigos, data_inicial, data_final, registry=None):
+    """Previsão diária de todos os itens (com modelo) em uma única passada
+
+    A matriz de features (memoizada por período) é reaproveitada por todos os modelos,
+    que rodam em paralelo no pool de inferência; com FORECAST_MODEL=global, todos os
+    itens saem de um único predict. O resultado vem em formato longo
+    (ds, week, codigo, qty_pred), na ordem de `codigos`. Devolve None se nenhum
+    dos itens tiver modelo.
+    """
+    future_dates, future_X = calendar_features(data_inicial, data_final)
+
+    if FORECAST_MODEL == "global":
+        codigos_previstos, previsoes = get_global_model().predict(list(codigos), future_X)
+        if not codigos_previstos:
+            return None
+        return daily_frame(future_dates, future_X, codigos_previstos, previsoes)
+
+    registry = registry or get_registry()
+    resultados = _predict_parallel(registry, list(codigos), future_X)
+    codigos_previstos = [codigo for codigo, _ in resultados]
+    previsoes = [previsao for _, previsao in resultados]
+
+    if not previsoes:
+        return None
+
+    return daily_frame(future_dates, future_X, codigos_previstos, np.concatenate(previsoes))
+
+
+def daily_frame(future_dates, future_X, codigos, previsoes):
+    """Monta o formato longo (ds, week, codigo, qty_pred), um bloco de dias por item"""
+    n_dias = len(future_dates)
+    return pd.DataFrame(
+        {
+            'ds': np.tile(future_dates.to_numpy(), len(codigos)),
+            'week': np.tile(week_of(future_X), len(codigos)),
+            'codigo': np.repeat(np.asarray(codigos, dtype=object), n_dias),
+            'qty_pred': previsoes,
+        }
+    )
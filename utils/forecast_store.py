@@ -0,0 +1,144 @@
+"""Previsões pré-calculadas (geradas em lote, ex.: toda noite)
+
+Uso:
+    python -m utils.forecast_store --days 180
+"""
+import argparse
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.data import BASE_DIR
+from utils.features import FEATURES_VERSION, calendar_features
+from utils.forecast import FORECAST_MODEL, available_codigos, daily_frame, models_version, predict_items
+
+FORECAST_DIR = os.environ.get("FORECAST_DIR", os.path.join(BASE_DIR, "previsoes"))
+FORECAST_HORIZON_DAYS = int(os.environ.get("FORECAST_HORIZON_DAYS", "180"))
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _paths(forecast_dir):
+    return os.path.join(forecast_dir, "forecast.parquet"), os.path.join(forecast_dir, "forecast.json")
+
+
+def generate_forecasts(start=None, days=FORECAST_HORIZON_DAYS, forecast_dir=FORECAST_DIR, registry=None):
+    """Roda todos os modelos no horizonte e grava a tabela de previsões"""
+    start = pd.Timestamp(start or pd.Timestamp.today()).normalize()
+    end = start + pd.Timedelta(days=days - 1)
+    versao_modelos = models_version(registry)
+
+    codigos = sorted(available_codigos(registry))
+    daily = predict_items(codigos, start, end, registry=registry)
+    if daily is None:
+        daily = pd.DataFrame({"ds": pd.Series(dtype="datetime64[ns]"), "codigo": [], "qty_pred": []})
+
+    os.makedirs(forecast_dir, exist_ok=True)
+    parquet_path, meta_path = _paths(forecast_dir)
+    tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+    daily[["codigo", "ds", "qty_pred"]].to_parquet(tmp_path, compression="zstd", index=False)
+    os.replace(tmp_path, parquet_path)
+
+    meta = {
+        "start": start.strftime("%Y-%m-%d"),
+        "end": end.strftime("%Y-%m-%d"),
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "items": int(daily["codigo"].nunique()),
+        "forecast_model": FORECAST_MODEL,
+        "models_version": versao_modelos,
+        "features_version": FEATURES_VERSION,
+    }
+    tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+    return meta
+
+
+def _load_store(forecast_dir):
+    """Carrega a tabela como matriz (itens x dias), recarregando se o arquivo mudar"""
+    global _store
+
+    parquet_path, meta_path = _paths(forecast_dir)
+    if not os.path.exists(meta_path) or not os.path.exists(parquet_path):
+        return None
+
+    mtime_ns = os.stat(meta_path).st_mtime_ns
+    store = _store
+    if store is not None and store["mtime_ns"] == mtime_ns and store["dir"] == forecast_dir:
+        return store
+
+    with _store_lock:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        daily = pd.read_parquet(parquet_path)
+        start = pd.Timestamp(meta["start"])
+        n_days = (pd.Timestamp(meta["end"]) - start).days + 1
+        # Linhas gravadas por item, em blocos contíguos de n_days dias
+        codigos = daily["codigo"].to_numpy()[::n_days] if len(daily) else np.array([], dtype=object)
+        _store = {
+            "dir": forecast_dir,
+            "mtime_ns": mtime_ns,
+            "meta": meta,
+            "start": start,
+            "n_days": n_days,
+            "positions": {str(codigo): posicao for posicao, codigo in enumerate(codigos)},
+            "matrix": daily["qty_pred"].to_numpy(dtype=np.float32).reshape(len(codigos), n_days),
+        }
+    return _store
+
+
+def lookup_forecasts(codigos, data_inicial, data_final, forecast_dir=FORECAST_DIR, registry=None):
+    """Previsão diária a partir da tabela pré-calculada
+
+    Mesmo formato de predict_items (ds, week, codigo, qty_pred). Devolve None se
+    o período não estiver coberto, se os modelos ou as features mudaram desde a
+    geração, ou se nenhum dos itens estiver na tabela.
+    """
+    store = _load_store(forecast_dir)
+    if store is None:
+        return None
+
+    meta = store["meta"]
+    if (
+        meta["features_version"] != FEATURES_VERSION
+        or meta.get("forecast_model", "item") != FORECAST_MODEL
+        or meta["models_version"] != models_version(registry)
+    ):
+        return None
+
+    inicio = (pd.Timestamp(data_inicial).normalize() - store["start"]).days
+    fim = (pd.Timestamp(data_final).normalize() - store["start"]).days
+    if inicio < 0 or fim >= store["n_days"] or fim < inicio:
+        return None
+
+    # Códigos normalizados como no registro de modelos (int ou str)
+    codigos_previstos = [codigo for codigo in codigos if str(codigo) in store["positions"]]
+    if not codigos_previstos:
+        return None
+
+    linhas = [store["positions"][str(codigo)] for codigo in codigos_previstos]
+    previsoes = store["matrix"][linhas, inicio:fim + 1]
+
+    future_dates, future_X = calendar_features(data_inicial, data_final)
+    return daily_frame(future_dates, future_X, codigos_previstos, previsoes.reshape(-1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera a tabela de previsões diárias de todos os modelos")
+    parser.add_argument("--start", help="Primeiro dia (AAAA-MM-DD); padrão: hoje")
+    parser.add_argument("--days", type=int, default=FORECAST_HORIZON_DAYS, help="Horizonte em dias")
+    parser.add_argument("--output", default=FORECAST_DIR, help="Diretório de saída")
+    args = parser.parse_args()
+
+    meta = generate_forecasts(start=args.start, days=args.days, forecast_dir=args.output)
+    print(f"Previsões de {meta['items']} itens de {meta['start']} a {meta['end']} gravadas em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ import pandas as pd
 from dash import html, dash_table
 from datetime import timedelta
 
+from utils.data import date_slice
+
 
 
 def create_card(title, card_id, icon_class):
@@ -76,42 +78,43 @@ def create_table(df, total_vendas):
     return table 
 
 # Filtra os fornecedores que iniciaram vendas no período selecionado
+# (df ordenado por data, como as tabelas de vendas de get_dataset)
 def new_suppliers_in_period(df, start_date, end_date):
-    filtered_df = df[(df["date"] >= start_date) & (df["date"] <= end_date)]
+    filtered_df = date_slice(df, start_date, end_date)
     first_sale_dates = filtered_df.groupby("proveedor_id")["date"].min().reset_index()
     new_suppliers = first_sale_dates[first_sale_dates["date"] >= start_date]
     return new_suppliers
 
-# Calcula o crescimento percentual das vendas
+# Calcula o crescimento percentual das vendas (df ordenado por data)
 def calculate_growth(df, start_date, end_date):
     previous_period_start = start_date - timedelta(days=(end_date - start_date).days + 1)
     previous_period_end = start_date - timedelta(days=1)
     
-    current_period_sales = df[(df["date"] >= start_date) & (df["date"] <= end_date)].groupby("proveedor_id")["total"].sum().reset_index()
-    previous_period_sales = df[(df["date"] >= previous_period_start) & (df["date"] <= previous_period_end)].groupby("proveedor_id")["total"].sum().reset_index()
+    current_period_sales = date_slice(df, start_date, end_date).groupby("proveedor_id")["total"].sum().reset_index()
+    previous_period_sales = date_slice(df, previous_period_start, previous_period_end).groupby("proveedor_id")["total"].sum().reset_index()
     
     growth_df = pd.merge(current_period_sales, previous_period_sales, on="proveedor_id", how="left", suffixes=("_current", "_previous"))
     growth_df["growth_percentage"] = ((growth_df["total_current"] - growth_df["total_previous"]) / growth_df["total_previous"]) * 100
     growth_df.fillna(0, inplace=True)  # Substitui NaN por 0 para novos fornecedores
     return growth_df
 
-# Função para calcular a classificação ABC
+# Função para calcular a classificação ABC (df ordenado por data)
 def calculate_abc(df, start_date, end_date):
     # Calcula o mesmo período do ano anterior
     previous_start_date = start_date - pd.DateOffset(years=1)
     previous_end_date = end_date - pd.DateOffset(years=1)
 
     # Filtra os dados para o período atual
-    current_period = df[(df["date"] >= start_date) & (df["date"] <= end_date)]
+    current_period = date_slice(df, start_date, end_date)
 
     # Filtra os dados para o mesmo período do ano anterior
-    previous_period = df[(df["date"] >= previous_start_date) & (df["date"] <= previous_end_date)]
+    previous_period = date_slice(df, previous_start_date, previous_end_date)
 
     # Agrupa por fornecedor e calcula:
     # - Total de vendas no período atual
     # - Contagem de códigos únicos no período atual
     current_sales = (
-        current_period.groupby(["proveedor_id", "proveedor"])
+        current_period.groupby(["proveedor_id", "proveedor"], observed=True)
         .agg(
             total_current=("total", "sum"),  # Total de vendas no período atual
             unique_codes_current=("codigo", "nunique")  # Contagem de códigos únicos no período atual
@@ -121,7 +124,7 @@ def calculate_abc(df, start_date, end_date):
 
     # Agrupa por fornecedor e calcula o total de vendas no período anterior
     previous_sales = (
-        previous_period.groupby(["proveedor_id", "proveedor"])
+        previous_period.groupby(["proveedor_id", "proveedor"], observed=True)
         .agg(total_previous=("total", "sum"))  # Total de vendas no período anterior
         .reset_index()
     )
@@ -129,6 +132,11 @@ def calculate_abc(df, start_date, end_date):
     # Combina os dados do período atual e do período anterior
     sales_by_supplier = pd.merge(current_sales, previous_sales, on=["proveedor_id", "proveedor"], how="left")
 
+    return classify_abc(sales_by_supplier)
+
+# Crescimento, ranking e classificação ABC a partir dos totais por fornecedor
+# (proveedor_id, proveedor, total_current, unique_codes_current, total_previous)
+def classify_abc(sales_by_supplier):
     # Preenche valores NaN com 0 para fornecedores sem vendas no período anterior
     sales_by_supplier["total_previous"] = sales_by_supplier["total_previous"].fillna(0)
 
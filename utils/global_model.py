@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import xgboost as xgb
+
+from utils.data import BASE_DIR, get_dataset
+from utils.features import FEATURES, FEATURES_VERSION
+from utils.models import MODEL_CHECK_INTERVAL, MODEL_FORMAT
+
+# Diretório do modelo global (um único modelo para todos os itens)
+GLOBAL_MODEL_DIR = os.environ.get("GLOBAL_MODEL_DIR", os.path.join(BASE_DIR, "modelo_global"))
+# Mesmo formato dos modelos por item (MODEL_FORMAT); um modelo.json antigo ainda é lido
+GLOBAL_MODEL_FILE = f"modelo.{MODEL_FORMAT}"
+
+# Atributos do item acrescentados às features de calendário (códigos inteiros)
+ITEM_FEATURES = ['item_id', 'proveedor_id', 'categoria_id', 'subcategoria_id']
+GLOBAL_FEATURES = FEATURES + ITEM_FEATURES
+
+
+def item_attributes():
+    """Atributos de cada item (codigo, proveedor_id, categoria, subcategoria), um por linha"""
+    sales = get_dataset("sales", columns=["codigo", "categoria", "subcategoria"])
+    categorias = sales.drop_duplicates("codigo", keep="last")
+    items = get_dataset("items", columns=["codigo", "proveedor_id"])
+    attrs = categorias.merge(items, on="codigo", how="left")
+    attrs["codigo"] = attrs["codigo"].astype(str)
+    attrs["categoria"] = attrs["categoria"].astype(str)
+    attrs["subcategoria"] = attrs["subcategoria"].astype(str)
+    return attrs.sort_values("codigo", kind="stable").reset_index(drop=True)
+
+
+def encode_items(attrs):
+    """Mapa codigo -> [item_id, proveedor_id, categoria_id, subcategoria_id]
+
+    O mapa é gravado junto com o modelo, para que a inferência use exatamente
+    os mesmos códigos do treino.
+    """
+    categoria_ids = {nome: i for i, nome in enumerate(sorted(attrs["categoria"].unique()))}
+    subcategoria_ids = {nome: i for i, nome in enumerate(sorted(attrs["subcategoria"].unique()))}
+    proveedor = attrs["proveedor_id"].fillna(-1).astype(np.int64)
+    return {
+        codigo: [i, int(prov), categoria_ids[cat], subcategoria_ids[sub]]
+        for i, (codigo, prov, cat, sub) in enumerate(
+            zip(attrs["codigo"], proveedor, attrs["categoria"], attrs["subcategoria"])
+        )
+    }
+
+
+def global_matrix(calendar_X, item_codes):
+    """Matriz (itens x dias) com as features de calendário seguidas das do item
+
+    `item_codes` tem uma linha por item; as linhas saem em blocos de dias por item,
+    na mesma ordem de forecast.daily_frame.
+    """
+    n_dias = len(calendar_X)
+    item_codes = np.asarray(item_codes, dtype=np.float32).reshape(-1, len(ITEM_FEATURES))
+    return np.hstack([np.tile(calendar_X, (len(item_codes), 1)), np.repeat(item_codes, n_dias, axis=0)])
+
+
+class GlobalModel:
+    """Modelo global carregado sob demanda e recarregado quando o arquivo muda"""
+
+    def __init__(self, model_dir=GLOBAL_MODEL_DIR, check_interval=MODEL_CHECK_INTERVAL):
+        self.model_dir = model_dir
+        self.check_interval = check_interval
+        self._loaded = None  # ((arquivo, mtime_ns), checked_at, modelo, itens); modelo None = recusado
+        self._lock = threading.Lock()
+
+    def _version(self):
+        """(arquivo, mtime_ns) do modelo no MODEL_FORMAT ou, se não houver, no outro formato"""
+        for fmt in dict.fromkeys([MODEL_FORMAT, "ubj", "json"]):
+            path = os.path.join(self.model_dir, f"modelo.{fmt}")
+            try:
+                return path, os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+        return None
+
+    def version(self):
+        """mtime_ns do arquivo do modelo (None se não houver modelo)"""
+        version = self._version()
+        return version[1] if version is not None else None
+
+    def _load(self):
+        now = time.monotonic()
+        loaded = self._loaded
+        if loaded is not None and now - loaded[1] <= self.check_interval:
+            return loaded if loaded[2] is not None else None
+
+        version = self._version()
+        if version is None:
+            self._loaded = None
+            return None
+
+        with self._lock:
+            loaded = self._loaded
+            if loaded is not None and loaded[0] == version:
+                loaded = (version, now, loaded[2], loaded[3])
+            else:
+                model = xgb.XGBRegressor()
+                model.load_model(version[0])
+                booster = model.get_booster()
+                if int(booster.attr("features_version") or -1) != FEATURES_VERSION:
+                    # Treinado com outro cálculo de features: não serve para prever.
+                    # A versão fica guardada como recusada para não reler o arquivo a cada pedido
+                    loaded = (version, now, None, None)
+                else:
+                    loaded = (version, now, model, json.loads(booster.attr("items")))
+            self._loaded = loaded
+        return loaded if loaded[2] is not None else None
+
+    def clear(self):
+        """Descarta o modelo carregado; o próximo uso relê o arquivo"""
+        self._loaded = None
+
+    def codigos(self):
+        loaded = self._load()
+        return list(loaded[3]) if loaded else []
+
+    def predict(self, codigos, calendar_X):
+        """(codigos previstos, previsões em blocos de dias por item) numa única chamada"""
+        loaded = self._load()
+        if loaded is None:
+            return [], np.zeros(0, dtype=np.float32)
+        _, _, model, items = loaded
+        codigos_previstos = [codigo for codigo in codigos if codigo in items]
+        if not codigos_previstos:
+            return [], np.zeros(0, dtype=np.float32)
+        X = global_matrix(calendar_X, [items[codigo] for codigo in codigos_previstos])
+        return codigos_previstos, model.predict(X)
+
+
+_global_model = None
+_global_model_lock = threading.Lock()
+
+
+def get_global_model():
+    """Modelo global compartilhado pelo processo"""
+    global _global_model
+    if _global_model is None:
+        with _global_model_lock:
+            if _global_model is None:
+                _global_model = GlobalModel()
+    return _global_model
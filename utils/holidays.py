@@ -0,0 +1,129 @@
+import os
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from utils.data import DATA_DIR
+
+# Feriados nacionais do Paraguai com data fixa (mês, dia)
+FIXED_HOLIDAYS = {
+    (1, 1): "Año Nuevo",
+    (3, 1): "Día de los Héroes",
+    (5, 1): "Día del Trabajador",
+    (5, 14): "Independencia Nacional",
+    (5, 15): "Independencia Nacional",
+    (6, 12): "Paz del Chaco",
+    (8, 15): "Fundación de Asunción",
+    (9, 29): "Victoria de Boquerón",
+    (12, 8): "Virgen de Caacupé",
+    (12, 25): "Navidad",
+}
+
+# Feriados móveis, em dias a partir do domingo de Páscoa
+EASTER_HOLIDAYS = {
+    -3: "Jueves Santo",
+    -2: "Viernes Santo",
+}
+
+# Eventos locais configuráveis (CSV com colunas date[,name]), somados aos nacionais
+LOCAL_HOLIDAYS_FILE = os.environ.get("LOCAL_HOLIDAYS_FILE", os.path.join(DATA_DIR, "feriados_locais.csv"))
+
+# Anos cobertos pela tabela pré-calculada (ampliada sob demanda)
+DEFAULT_YEARS = (2015, 2035)
+
+_table = None
+_lock = threading.Lock()
+
+
+def easter_sunday(year):
+    """Domingo de Páscoa (calendário gregoriano, algoritmo anônimo)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def local_holidays(path=LOCAL_HOLIDAYS_FILE):
+    """Datas dos eventos locais configurados (vazio se o arquivo não existir)"""
+    if not path or not os.path.exists(path):
+        return {}
+    df = pd.read_csv(path, parse_dates=["date"])
+    names = df["name"] if "name" in df.columns else pd.Series("Evento local", index=df.index)
+    return {ts.date(): name for ts, name in zip(df["date"], names)}
+
+
+def holidays_for_year(year, local=None):
+    """Mapa data -> nome de todos os feriados do ano"""
+    holidays = {date(year, month, day): name for (month, day), name in FIXED_HOLIDAYS.items()}
+    easter = easter_sunday(year)
+    for offset, name in EASTER_HOLIDAYS.items():
+        holidays[easter + timedelta(days=offset)] = name
+    for day, name in (local or {}).items():
+        if day.year == year:
+            holidays[day] = name
+    return holidays
+
+
+def _build_table(first_year, last_year):
+    """Tabela indexada por dia: is_holiday e is_week_holiday (semana ISO com feriado)"""
+    base = pd.Timestamp(first_year, 1, 1)
+    dates = pd.date_range(base, pd.Timestamp(last_year, 12, 31), freq="D")
+    local = local_holidays()
+
+    holiday_dates = [day for year in range(first_year, last_year + 1) for day in holidays_for_year(year, local)]
+    is_holiday = dates.isin(pd.DatetimeIndex(holiday_dates))
+
+    # Agrupa os dias pela segunda-feira da sua semana ISO; a semana é de feriado se algum dia for
+    week_start = (dates - pd.to_timedelta(dates.weekday, unit="D")).to_numpy()
+    week_ids, week_index = np.unique(week_start, return_inverse=True)
+    week_has_holiday = np.zeros(len(week_ids), dtype=bool)
+    np.logical_or.at(week_has_holiday, week_index, is_holiday)
+
+    return {
+        "base": base,
+        "first_year": first_year,
+        "last_year": last_year,
+        "is_holiday": is_holiday,
+        "is_week_holiday": week_has_holiday[week_index],
+    }
+
+
+def _get_table(first_year, last_year):
+    global _table
+    table = _table
+    if table is None or first_year < table["first_year"] or last_year > table["last_year"]:
+        with _lock:
+            table = _table
+            if table is None or first_year < table["first_year"] or last_year > table["last_year"]:
+                # Margem de um ano nas pontas para as semanas ISO que cruzam a virada do ano
+                first = min(first_year - 1, DEFAULT_YEARS[0], table["first_year"] if table else first_year)
+                last = max(last_year + 1, DEFAULT_YEARS[1], table["last_year"] if table else last_year)
+                table = _build_table(first, last)
+                _table = table
+    return table
+
+
+def holiday_flags(dates):
+    """Arrays booleanos (is_holiday, is_week_holiday) para as datas informadas"""
+    dates = pd.DatetimeIndex(dates).normalize()
+    if len(dates) == 0:
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype=bool)
+    table = _get_table(dates.min().year, dates.max().year)
+    offsets = (dates - table["base"]).days.to_numpy()
+    return table["is_holiday"][offsets], table["is_week_holiday"][offsets]
+
+
+def reload_holidays():
+    """Descarta a tabela pré-calculada (ex.: depois de editar os eventos locais)"""
+    global _table
+    with _lock:
+        _table = None
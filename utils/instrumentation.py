@@ -0,0 +1,224 @@
+"""Métricas por callback do Dash e endpoint /metrics (formato texto do Prometheus)
+
+Ativado com METRICS_ENABLED=1. Cada callback registrado é medido: tempo total
+da chamada, tempo gasto serializando a resposta em JSON e tamanho da resposta.
+Com PROFILE_SAMPLE_RATE > 0, uma fração das chamadas roda sob o cProfile e o
+resultado é gravado em PROFILE_DIR (abrir com `python -m pstats` ou snakeviz).
+
+As métricas são de cada processo; com vários workers do gunicorn, cada scrape
+mostra o worker que atendeu. Com METRICS_TOKEN definido, o /metrics exige o
+cabeçalho "Authorization: Bearer <token>" (bearer_token no Prometheus); sem
+ele, só responde a requisições vindas da própria máquina (127.0.0.1/::1).
+"""
+import contextvars
+import cProfile
+import functools
+import hmac
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from dash import _callback
+from dash.exceptions import PreventUpdate
+from flask import Response, abort, request
+
+from utils.data import BASE_DIR
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "0") == "1"
+# Quantidade de chamadas recentes por callback usadas nos percentis
+METRICS_WINDOW = int(os.environ.get("METRICS_WINDOW", "1024"))
+# Fração das chamadas perfiladas com cProfile (0 = desligado)
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+# Token exigido pelo /metrics (vazio = só acesso local)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Tempo de serialização acumulado na chamada de callback em andamento
+_serialize_seconds = contextvars.ContextVar("serialize_seconds", default=None)
+# Um perfil por vez: o cProfile não aceita dois perfis ativos ao mesmo tempo
+_profile_lock = threading.Lock()
+
+
+class CallbackMetrics:
+    """Contadores e janela das últimas chamadas de cada callback"""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _serie(self, name):
+        serie = self._series.get(name)
+        if serie is None:
+            serie = {
+                "count": 0,
+                "errors": 0,
+                "profiles": 0,
+                "duration_sum": 0.0,
+                "serialize_sum": 0.0,
+                "bytes_sum": 0,
+                "duration": deque(maxlen=self.window),
+                "serialize": deque(maxlen=self.window),
+                "bytes": deque(maxlen=self.window),
+            }
+            self._series[name] = serie
+        return serie
+
+    def record(self, name, duration, serialize, payload_bytes, error=False, profiled=False):
+        with self._lock:
+            serie = self._serie(name)
+            serie["count"] += 1
+            serie["errors"] += int(error)
+            serie["profiles"] += int(profiled)
+            serie["duration_sum"] += duration
+            serie["serialize_sum"] += serialize
+            serie["bytes_sum"] += payload_bytes
+            serie["duration"].append(duration)
+            serie["serialize"].append(serialize)
+            serie["bytes"].append(payload_bytes)
+
+    def render(self):
+        """Métricas no formato texto de exposição do Prometheus"""
+        with self._lock:
+            series = {
+                name: {chave: list(valor) if isinstance(valor, deque) else valor for chave, valor in serie.items()}
+                for name, serie in self._series.items()
+            }
+
+        linhas = []
+        resumos = [
+            ("dash_callback_duration_seconds", "duration", "duration_sum", "Tempo total do callback, com serialização"),
+            ("dash_callback_serialize_seconds", "serialize", "serialize_sum", "Tempo serializando a resposta em JSON"),
+            ("dash_callback_payload_bytes", "bytes", "bytes_sum", "Tamanho da resposta serializada"),
+        ]
+        for metrica, janela, soma, descricao in resumos:
+            linhas.append(f"# HELP {metrica} {descricao}")
+            linhas.append(f"# TYPE {metrica} summary")
+            for name, serie in sorted(series.items()):
+                label = _label(name)
+                if serie[janela]:
+                    for quantil, valor in zip(QUANTILES, np.quantile(serie[janela], QUANTILES)):
+                        linhas.append(f'{metrica}{{callback="{label}",quantile="{quantil}"}} {valor:.6g}')
+                linhas.append(f'{metrica}_sum{{callback="{label}"}} {serie[soma]:.6g}')
+                linhas.append(f'{metrica}_count{{callback="{label}"}} {serie["count"]}')
+
+        contadores = [
+            ("dash_callback_errors_total", "errors", "Chamadas que terminaram em exceção"),
+            ("dash_callback_profiles_total", "profiles", "Chamadas perfiladas com cProfile"),
+        ]
+        for metrica, chave, descricao in contadores:
+            linhas.append(f"# HELP {metrica} {descricao}")
+            linhas.append(f"# TYPE {metrica} counter")
+            for name, serie in sorted(series.items()):
+                linhas.append(f'{metrica}{{callback="{_label(name)}"}} {serie[chave]}')
+        return "\n".join(linhas) + "\n"
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = CallbackMetrics()
+
+
+def _timed_to_json(to_json):
+    @functools.wraps(to_json)
+    def timed(obj):
+        inicio = time.perf_counter()
+        try:
+            return to_json(obj)
+        finally:
+            acumulado = _serialize_seconds.get()
+            if acumulado is not None:
+                acumulado[0] += time.perf_counter() - inicio
+
+    timed.instrumented = True
+    return timed
+
+
+def _profile_path(name):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    return os.path.join(PROFILE_DIR, f"{name}_{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}.prof")
+
+
+def instrument_callback(name, func):
+    """Envolve a função registrada no callback_map (que já devolve o JSON da resposta)"""
+
+    @functools.wraps(func)
+    def instrumented(*args, **kwargs):
+        acumulado = [0.0]
+        token = _serialize_seconds.set(acumulado)
+        perfilar = (
+            PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE and _profile_lock.acquire(blocking=False)
+        )
+        resposta, erro = None, False
+        inicio = time.perf_counter()
+        try:
+            if perfilar:
+                profiler = cProfile.Profile()
+                try:
+                    resposta = profiler.runcall(func, *args, **kwargs)
+                finally:
+                    profiler.dump_stats(_profile_path(name))
+                    _profile_lock.release()
+            else:
+                resposta = func(*args, **kwargs)
+            return resposta
+        except PreventUpdate:
+            raise
+        except Exception:
+            erro = True
+            raise
+        finally:
+            duracao = time.perf_counter() - inicio
+            _serialize_seconds.reset(token)
+            tamanho = len(resposta.encode("utf-8")) if isinstance(resposta, str) else 0
+            metrics.record(name, duracao, acumulado[0], tamanho, error=erro, profiled=perfilar)
+
+    instrumented.instrumented = True
+    return instrumented
+
+
+def instrument_callbacks(callback_map):
+    """Instrumenta as entradas ainda não instrumentadas do callback_map"""
+    for entry in callback_map.values():
+        func = entry.get("callback")
+        if func is None or getattr(func, "instrumented", False):
+            continue
+        original = getattr(func, "__wrapped__", func)
+        name = f"{original.__module__}.{original.__name__}"
+        entry["callback"] = instrument_callback(name, func)
+
+
+def metrics_allowed():
+    """Acesso ao /metrics: token correto ou, sem METRICS_TOKEN, requisição local"""
+    if METRICS_TOKEN:
+        esperado = f"Bearer {METRICS_TOKEN}".encode()
+        return hmac.compare_digest(request.headers.get("Authorization", "").encode(), esperado)
+    return request.remote_addr in ("127.0.0.1", "::1")
+
+
+def instrument_app(app):
+    """Liga a instrumentação dos callbacks e o endpoint /metrics se METRICS_ENABLED=1"""
+    if not METRICS_ENABLED:
+        return
+
+    if not getattr(_callback.to_json, "instrumented", False):
+        _callback.to_json = _timed_to_json(_callback.to_json)
+
+    # Os callbacks das páginas só entram no callback_map no primeiro request
+    # (before_request do próprio Dash, registrado antes deste)
+    @app.server.before_request
+    def _instrument_callbacks():
+        instrument_callbacks(app.callback_map)
+
+    @app.server.route("/metrics")
+    def _metrics():
+        if not metrics_allowed():
+            abort(403)
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,230 @@
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import xgboost as xgb
+
+from utils.data import BASE_DIR
+
+# Diretório dos modelos por item (modelo_{codigo}.ubj ou .json)
+MODELS_DIR = os.environ.get("MODELS_DIR", os.path.join(BASE_DIR, "modelos"))
+# Memória máxima (aprox.) ocupada pelos modelos carregados em cada processo
+MODEL_CACHE_MB = float(os.environ.get("MODEL_CACHE_MB", "512"))
+# Intervalo (s) entre verificações do diretório e do mtime dos modelos
+MODEL_CHECK_INTERVAL = float(os.environ.get("MODEL_CHECK_INTERVAL", "30"))
+# Formato gravado pelo treino: "ubj" (binário, mais rápido de carregar) ou "json"
+MODEL_FORMAT = os.environ.get("MODEL_FORMAT", "ubj")
+
+MODEL_FILE_RE = re.compile(r"^modelo_(?P<codigo>.+)\.(?:json|ubj)$")
+
+# Pacote com todos os modelos num só arquivo: BUNDLE_MAGIC, tamanho do índice
+# (uint64 little-endian), índice JSON {codigo: [offset, tamanho]} e os modelos
+# em UBJ concatenados (offsets relativos ao fim do índice)
+BUNDLE_FILE = "modelos.bundle"
+BUNDLE_MAGIC = b"XGBBNDL1"
+BUNDLE_HEADER = struct.Struct("<8sQ")
+
+
+def model_path(models_dir, codigo, fmt=MODEL_FORMAT):
+    return os.path.join(models_dir, f"modelo_{codigo}.{fmt}")
+
+
+def open_bundle(path):
+    """Índice do pacote e o arquivo mapeado em memória"""
+    with open(path, "rb") as f:
+        magic, index_size = BUNDLE_HEADER.unpack(f.read(BUNDLE_HEADER.size))
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f"{path} não é um pacote de modelos")
+        index = json.loads(f.read(index_size))
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return {
+        "path": path,
+        "mtime_ns": os.stat(path).st_mtime_ns,
+        "index": index,
+        "data_offset": BUNDLE_HEADER.size + index_size,
+        "mmap": data,
+    }
+
+
+class ModelRegistry:
+    """Índice dos modelos em `models_dir` com cache LRU dos modelos carregados
+
+    Os arquivos são indexados uma vez (e reindexados a cada `check_interval`
+    segundos); cada modelo é carregado só no primeiro uso e recarregado apenas
+    quando o mtime do arquivo muda. O cache é limitado por `max_bytes`.
+
+    Se houver um pacote (BUNDLE_FILE), os modelos são lidos de fatias do arquivo
+    mapeado em memória; arquivos soltos mais novos que o pacote têm prioridade.
+    """
+
+    def __init__(self, models_dir=MODELS_DIR, max_bytes=None, check_interval=MODEL_CHECK_INTERVAL):
+        self.models_dir = models_dir
+        self.max_bytes = max_bytes if max_bytes is not None else int(MODEL_CACHE_MB * 1024 * 1024)
+        self.check_interval = check_interval
+        self._index = {}
+        self._index_version = None
+        self._indexed_at = None
+        self._cache = OrderedDict()  # codigo -> (mtime_ns, nbytes, checked_at, modelo)
+        self._bytes = 0
+        self._bundle = None
+        self._lock = threading.Lock()
+
+    def _scan_bundle(self):
+        path = os.path.join(self.models_dir, BUNDLE_FILE)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self._bundle = None
+            return None
+        if self._bundle is None or self._bundle["mtime_ns"] != mtime_ns:
+            # O mapa anterior continua válido para quem ainda o usa (os.replace troca o inode)
+            self._bundle = open_bundle(path)
+        return self._bundle
+
+    def _scan(self):
+        """Mapa codigo -> (versão, caminho, pacote, offset no pacote, tamanho em bytes)"""
+        index = {}
+        if not os.path.isdir(self.models_dir):
+            return index
+
+        bundle = self._scan_bundle()
+        if bundle is not None:
+            for codigo, (offset, size) in bundle["index"].items():
+                index[codigo] = (bundle["mtime_ns"], bundle["path"], bundle, offset, size)
+
+        for entry in os.scandir(self.models_dir):
+            match = MODEL_FILE_RE.match(entry.name)
+            if match:
+                codigo = match.group("codigo")
+                stat = entry.stat()
+                atual = index.get(codigo)
+                # Vale o mais novo entre o pacote e os arquivos .json/.ubj do item;
+                # o tamanho do arquivo serve de estimativa da memória no cache LRU
+                if atual is None or stat.st_mtime_ns > atual[0]:
+                    index[codigo] = (stat.st_mtime_ns, entry.path, None, None, stat.st_size)
+        return index
+
+    def index(self):
+        """Mapa codigo -> localização do modelo"""
+        now = time.monotonic()
+        if self._indexed_at is None or now - self._indexed_at > self.check_interval:
+            index = self._scan()
+            # Quantidade e soma dos mtimes: muda quando algum modelo é criado,
+            # removido ou sobrescrito no lugar (cp, rsync --inplace)
+            self._index_version = f"{len(index)}:{sum(entry[0] for entry in index.values())}"
+            self._index = index
+            self._indexed_at = now
+        return self._index
+
+    def version(self):
+        """Versão do conjunto de modelos indexados (quantidade e mtimes dos arquivos)"""
+        self.index()
+        return self._index_version
+
+    def has_model(self, codigo):
+        return str(codigo) in self.index()
+
+    def raw(self, codigo):
+        """Conteúdo do modelo como gravado (bytes), ou None se não houver modelo"""
+        entry = self.index().get(str(codigo))
+        if entry is None:
+            return None
+        _, path, bundle, offset, size = entry
+        if bundle is not None:
+            start = bundle["data_offset"] + offset
+            return bundle["mmap"][start:start + size]
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _load(self, entry):
+        # n_jobs=1: o paralelismo vem do pool de inferência (um modelo por thread)
+        model = xgb.XGBRegressor(n_jobs=1)
+        _, path, bundle, offset, size = entry
+        if bundle is not None:
+            start = bundle["data_offset"] + offset
+            model.load_model(bytearray(bundle["mmap"][start:start + size]))
+            return model, size
+        model.load_model(path)
+        return model, size
+
+    def _version(self, entry):
+        version, path, bundle, _, _ = entry
+        if bundle is not None:
+            # A fatia pertence a este mapa do pacote; um pacote novo chega pelo reindex
+            return version
+        return os.stat(path).st_mtime_ns
+
+    def get(self, codigo):
+        """Modelo do item (XGBRegressor) ou None se não houver modelo treinado"""
+        codigo = str(codigo)
+        entry = self.index().get(codigo)
+        if entry is None:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(codigo)
+            if cached is not None and now - cached[2] <= self.check_interval:
+                self._cache.move_to_end(codigo)
+                return cached[3]
+
+        try:
+            mtime_ns = self._version(entry)
+        except FileNotFoundError:
+            self.forget(codigo)
+            return None
+
+        if cached is not None and cached[0] == mtime_ns:
+            with self._lock:
+                if codigo in self._cache:
+                    self._cache[codigo] = (mtime_ns, cached[1], now, cached[3])
+                    self._cache.move_to_end(codigo)
+            return cached[3]
+
+        model, nbytes = self._load(entry)
+        with self._lock:
+            previous = self._cache.pop(codigo, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._cache[codigo] = (mtime_ns, nbytes, now, model)
+            self._bytes += nbytes
+            # Despeja os modelos menos usados até caber no limite de memória
+            while self._bytes > self.max_bytes and len(self._cache) > 1:
+                _, evicted = self._cache.popitem(last=False)
+                self._bytes -= evicted[1]
+        return model
+
+    def forget(self, codigo):
+        with self._lock:
+            cached = self._cache.pop(str(codigo), None)
+            if cached is not None:
+                self._bytes -= cached[1]
+
+    def clear(self):
+        """Descarta o índice e os modelos carregados"""
+        with self._lock:
+            self._cache.clear()
+            self._bytes = 0
+            self._indexed_at = None
+
+    def stats(self):
+        return {"models": len(self._cache), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Registro de modelos compartilhado pelo processo"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
@@ -0,0 +1,107 @@
+import math
+import os
+import re
+
+import pandas as pd
+
+# Paginação, ordenação e filtro no servidor para as DataTables
+# (page_action/sort_action/filter_action="custom"). O resultado completo fica
+# num DataFrame memoizado pela página; a cada interação só a página visível é
+# formatada e enviada ao navegador.
+PAGE_SIZE = int(os.environ.get("TABLE_PAGE_SIZE", "25"))
+
+# Termo de filter_query: {coluna} [i|s]operador valor
+_FILTER_RE = re.compile(
+    r"^\{(?P<column>[^}]*)\}\s*(?P<case>[is]?)"
+    r"(?P<operator>>=|<=|!=|=|<|>|eq|ne|ge|le|gt|lt|contains|datestartswith)\s*(?P<value>.*)$"
+)
+_OPERATORS = {"=": "eq", "!=": "ne", ">=": "ge", "<=": "le", ">": "gt", "<": "lt"}
+
+
+def table_props():
+    """Propriedades comuns das tabelas paginadas no servidor"""
+    return {
+        "page_action": "custom",
+        "sort_action": "custom",
+        "filter_action": "custom",
+        "page_current": 0,
+        "page_size": PAGE_SIZE,
+        "sort_by": [],
+        "filter_query": "",
+    }
+
+
+def split_filter_part(part):
+    """(coluna, operador, valor, sensível a maiúsculas) de um termo do filter_query"""
+    match = _FILTER_RE.match(part.strip())
+    if match is None:
+        return None
+    operator = _OPERATORS.get(match["operator"], match["operator"])
+    value = match["value"].strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"`":
+        value = value[1:-1].replace("\\" + value[0], value[0])
+    else:
+        try:
+            value = float(value)
+        except ValueError:
+            pass
+    return match["column"], operator, value, match["case"] != "i"
+
+
+def _as_text(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def filter_frame(df, filter_query):
+    """Linhas que satisfazem todos os termos do filter_query (termos inválidos são ignorados)"""
+    if not filter_query:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for part in filter_query.split(" && "):
+        termo = split_filter_part(part)
+        if termo is None or termo[0] not in df.columns:
+            continue
+        column, operator, value, case = termo
+        serie = df[column]
+        numerica = pd.api.types.is_numeric_dtype(serie) and isinstance(value, float)
+        if not numerica:
+            serie, value = serie.astype(str), _as_text(value)
+            if not case:
+                serie, value = serie.str.lower(), value.lower()
+
+        if operator == "contains":
+            mask &= serie.str.contains(value, regex=False) if not numerica else serie == value
+        elif operator == "datestartswith":
+            mask &= serie.str.startswith(value) if not numerica else serie == value
+        else:
+            mask &= getattr(serie, operator)(value)
+    return df[mask]
+
+
+def sort_frame(df, sort_by):
+    """Ordena pelas colunas de sort_by (ordenação estável; colunas desconhecidas são ignoradas)"""
+    sort_by = [s for s in sort_by or [] if s["column_id"] in df.columns]
+    if not sort_by:
+        return df
+    return df.sort_values(
+        [s["column_id"] for s in sort_by],
+        ascending=[s["direction"] == "asc" for s in sort_by],
+        kind="stable",
+        na_position="last",
+    )
+
+
+def page_records(df, page_current=0, page_size=PAGE_SIZE, sort_by=None, filter_query=None, formatter=None):
+    """Registros da página pedida (já formatados) e total de páginas após filtro e ordenação"""
+    if df is None:
+        return [], 1
+    df = sort_frame(filter_frame(df, filter_query), sort_by)
+    page_size = page_size or PAGE_SIZE
+    page_count = max(1, math.ceil(len(df) / page_size))
+    inicio = (page_current or 0) * page_size
+    page = df.iloc[inicio:inicio + page_size]
+    if formatter is not None:
+        page = formatter(page.copy())
+    return page.to_dict("records"), page_count
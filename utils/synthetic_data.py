@@ -0,0 +1,173 @@
+"""Gerador de dados sintéticos (sales, sales_proveedor, items e proveedor)
+
+Gera os CSVs de data/ com as mesmas colunas de utils.data.DATASETS, para
+reproduzir desempenho em escala sem os dados de produção. As vendas têm
+popularidade desigual entre itens e fornecedores, hierarquia de categorias
+consistente, tendência anual e sazonalidade (mês, dia da semana, dias de
+pagamento e feriados).
+
+Uso:
+    python -m utils.synthetic_data --output /tmp/dados --skus 5000 --suppliers 200 --years 3
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.data import DATASETS
+from utils.features import PAYDAYS
+from utils.holidays import holiday_flags
+
+# Fatores de venda por dia da semana (segunda a domingo)
+WEEKDAY_FACTORS = np.array([0.9, 0.9, 0.95, 1.0, 1.15, 1.3, 0.8])
+PAYDAY_FACTOR = 1.2
+HOLIDAY_FACTOR = 0.6
+# Ramificação da hierarquia de categorias a partir de cada nível
+HIERARCHY_FANOUT = [3, 2, 2, 2]
+
+
+def build_hierarchy(rng, n_categories):
+    """Folhas da árvore categoria > subcategoria > nível 3 > 4 > 5, uma linha por folha"""
+    folhas = [["CATEGORIA {}".format(i + 1)] for i in range(n_categories)]
+    prefixos = ["SUB", "N3", "N4", "N5"]
+    for prefixo, fanout in zip(prefixos, HIERARCHY_FANOUT):
+        folhas = [
+            caminho + [f"{prefixo} {caminho[-1].split()[-1]}.{j + 1}"]
+            for caminho in folhas
+            for j in range(int(rng.integers(1, fanout + 1)))
+        ]
+    return pd.DataFrame(folhas, columns=["categoria", "subcategoria", "cat_nivel3", "cat_nivel4", "cat_nivel5"])
+
+
+def build_catalog(rng, n_skus, n_suppliers, n_categories):
+    """Itens com fornecedor, categoria, preço, popularidade e sazonalidade próprios"""
+    hierarquia = build_hierarchy(rng, n_categories)
+    proveedor = pd.DataFrame(
+        {
+            "proveedor_id": np.arange(1, n_suppliers + 1, dtype=np.int32),
+            "name": [f"PROVEEDOR {i:04d}" for i in range(1, n_suppliers + 1)],
+        }
+    )
+
+    # Poucos fornecedores concentram a maior parte dos itens (lei de potência)
+    peso_fornecedor = 1.0 / np.arange(1, n_suppliers + 1) ** 0.8
+    fornecedores = rng.choice(proveedor["proveedor_id"].to_numpy(), n_skus, p=peso_fornecedor / peso_fornecedor.sum())
+    folhas = rng.integers(0, len(hierarquia), n_skus)
+
+    items = hierarquia.iloc[folhas].reset_index(drop=True)
+    items.insert(0, "codigo", np.arange(100000, 100000 + n_skus, dtype=np.int64))
+    items.insert(1, "descripcion", [f"PRODUTO {codigo}" for codigo in items["codigo"]])
+    items.insert(2, "proveedor_id", fornecedores.astype(np.int32))
+    items["price"] = np.round(rng.lognormal(mean=9.5, sigma=0.8, size=n_skus), -1)
+    items["popularity"] = rng.pareto(1.2, n_skus) + 0.05
+    items["mean_qty"] = rng.gamma(1.5, 2.0, n_skus)
+
+    # Pico de vendas anual por categoria (mês), com intensidade própria
+    categorias = items["categoria"].unique()
+    pico = dict(zip(categorias, rng.uniform(0, 12, len(categorias))))
+    amplitude = dict(zip(categorias, rng.uniform(0.1, 0.6, len(categorias))))
+    items["peak_month"] = items["categoria"].map(pico)
+    items["seasonal_amplitude"] = items["categoria"].map(amplitude)
+    return items, proveedor
+
+
+def day_factors(dates, growth, start):
+    """Multiplicador de volume de cada dia: tendência, dia da semana, pagamento e feriados
+
+    A tendência é contada em anos desde `start`, o primeiro dia dos dados gerados.
+    """
+    anos = (dates - start).days.to_numpy() / 365.25
+    fator = (1 + growth) ** anos * WEEKDAY_FACTORS[dates.weekday]
+    fator = fator * np.where(np.isin(dates.day, PAYDAYS), PAYDAY_FACTOR, 1.0)
+    is_holiday, _ = holiday_flags(dates)
+    return fator * np.where(is_holiday, HOLIDAY_FACTOR, 1.0)
+
+
+def generate_month(rng, items, proveedor_names, dates, daily_transactions, growth, start):
+    """Transações de um mês (uma linha por venda) com as colunas de sales_proveedor"""
+    n_por_dia = rng.poisson(daily_transactions * day_factors(dates, growth, start))
+    dias = np.repeat(np.arange(len(dates)), n_por_dia)
+
+    # Peso de cada item no mês: popularidade x sazonalidade da categoria
+    mes = dates[0].month - 1
+    sazonal = 1 + items["seasonal_amplitude"].to_numpy() * np.cos(
+        2 * np.pi * (mes - items["peak_month"].to_numpy()) / 12
+    )
+    peso = items["popularity"].to_numpy() * sazonal
+    escolhidos = rng.choice(len(items), len(dias), p=peso / peso.sum())
+
+    qty = (1 + rng.poisson(items["mean_qty"].to_numpy()[escolhidos])).astype(np.float64)
+    preco = items["price"].to_numpy()[escolhidos] * rng.uniform(0.9, 1.1, len(dias))
+    datas = dates[dias]
+    vendas = items.iloc[escolhidos][
+        ["codigo", "proveedor_id", "categoria", "subcategoria", "cat_nivel3", "cat_nivel4", "cat_nivel5"]
+    ].reset_index(drop=True)
+    vendas.insert(0, "date", datas.strftime("%Y-%m-%d"))
+    vendas["year"] = datas.year
+    vendas["month"] = datas.month
+    vendas["week"] = datas.isocalendar().week.to_numpy()
+    vendas["qty"] = qty
+    vendas["total"] = np.round(qty * preco, 0)
+    vendas["proveedor"] = proveedor_names[vendas["proveedor_id"].to_numpy() - 1]
+    return vendas
+
+
+def generate(output, n_skus=2000, n_suppliers=100, start_year=None, years=3, daily_transactions=1000,
+             n_categories=8, growth=0.08, seed=0):
+    """Grava os quatro CSVs em `output`; devolve o número de linhas de vendas"""
+    rng = np.random.default_rng(seed)
+    os.makedirs(output, exist_ok=True)
+    start_year = start_year or pd.Timestamp.today().year - years
+    items, proveedor = build_catalog(rng, n_skus, n_suppliers, n_categories)
+
+    items[DATASETS["items"]["usecols"]].to_csv(os.path.join(output, "items.csv"), index=False)
+    proveedor[DATASETS["proveedor"]["usecols"]].to_csv(os.path.join(output, "proveedor.csv"), index=False)
+
+    sales_path = os.path.join(output, "sales.csv")
+    proveedor_path = os.path.join(output, "sales_proveedor.csv")
+    proveedor_names = proveedor["name"].to_numpy()
+    linhas = 0
+    # Um mês por vez, para que a memória não cresça com o volume gerado
+    start = pd.Timestamp(f"{start_year}-01-01")
+    for numero, inicio in enumerate(pd.date_range(start, periods=years * 12, freq="MS")):
+        dates = pd.date_range(inicio, inicio + pd.offsets.MonthEnd(0), freq="D")
+        vendas = generate_month(rng, items, proveedor_names, dates, daily_transactions, growth, start)
+        modo, cabecalho = ("w", True) if numero == 0 else ("a", False)
+        vendas[DATASETS["sales"]["usecols"]].to_csv(sales_path, mode=modo, header=cabecalho, index=False)
+        vendas[DATASETS["sales_proveedor"]["usecols"]].to_csv(proveedor_path, mode=modo, header=cabecalho, index=False)
+        linhas += len(vendas)
+    return linhas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos de vendas no formato de data/")
+    parser.add_argument("--output", required=True, help="Diretório de saída (ex.: /tmp/dados)")
+    parser.add_argument("--skus", type=int, default=2000, help="Número de itens")
+    parser.add_argument("--suppliers", type=int, default=100, help="Número de fornecedores")
+    parser.add_argument("--start-year", type=int, help="Primeiro ano (padrão: anos completos até o ano passado)")
+    parser.add_argument("--years", type=int, default=3, help="Número de anos")
+    parser.add_argument("--daily-transactions", type=int, default=1000, help="Média de vendas por dia")
+    parser.add_argument("--categories", type=int, default=8, help="Número de categorias de primeiro nível")
+    parser.add_argument("--growth", type=float, default=0.08, help="Crescimento anual do volume")
+    parser.add_argument("--seed", type=int, default=0, help="Semente do gerador aleatório")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    linhas = generate(
+        args.output,
+        n_skus=args.skus,
+        n_suppliers=args.suppliers,
+        start_year=args.start_year,
+        years=args.years,
+        daily_transactions=args.daily_transactions,
+        n_categories=args.categories,
+        growth=args.growth,
+        seed=args.seed,
+    )
+    print(f"{linhas} vendas de {args.skus} itens gravadas em {args.output} em {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
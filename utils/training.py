@@ -0,0 +1,390 @@
+"""Treino em lote dos modelos por item (modelos/modelo_{codigo}.ubj)
+
+Por padrão o treino é incremental: só itens cujas vendas mudaram (ou cujo
+modelo está velho demais) são treinados de novo.
+
+Uso:
+    python -m utils.training --n-jobs -1
+    python -m utils.training --full
+    python -m utils.training --bundle
+    python -m utils.training --global
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from joblib import Parallel, delayed
+
+from utils.data import get_dataset
+from utils.features import FEATURES, FEATURES_VERSION, features_for_dates
+from utils.global_model import (
+    GLOBAL_FEATURES,
+    GLOBAL_MODEL_DIR,
+    GLOBAL_MODEL_FILE,
+    encode_items,
+    global_matrix,
+    item_attributes,
+)
+from utils.models import (
+    BUNDLE_FILE,
+    BUNDLE_HEADER,
+    BUNDLE_MAGIC,
+    MODEL_FILE_RE,
+    MODEL_FORMAT,
+    MODELS_DIR,
+    ModelRegistry,
+    model_path,
+)
+
+# Hiperparâmetros dos regressores por item (n_jobs=1: o paralelismo é entre itens)
+TRAIN_PARAMS = {
+    "n_estimators": 200,
+    "max_depth": 6,
+    "learning_rate": 0.1,
+    "subsample": 0.8,
+    "tree_method": "hist",
+    "n_jobs": 1,
+}
+# Hiperparâmetros do modelo global (mais árvores: um modelo aprende todos os itens)
+GLOBAL_TRAIN_PARAMS = {
+    "n_estimators": 500,
+    "max_depth": 8,
+    "learning_rate": 0.1,
+    "subsample": 0.8,
+    "tree_method": "hist",
+}
+# Itens com menos dias de histórico que isso não são treinados
+MIN_HISTORY_DAYS = int(os.environ.get("MIN_HISTORY_DAYS", "30"))
+# Modelos mais velhos que isso são treinados de novo mesmo sem vendas novas
+MAX_MODEL_AGE_DAYS = float(os.environ.get("MAX_MODEL_AGE_DAYS", "30"))
+# Rodadas extras de boosting ao continuar o treino a partir do modelo existente
+CONTINUE_ROUNDS = int(os.environ.get("CONTINUE_ROUNDS", "50"))
+# Limite de árvores de um modelo continuado; acima dele o item é treinado do zero
+MAX_MODEL_TREES = int(os.environ.get("MAX_MODEL_TREES", "400"))
+
+# Impressões digitais dos dados de cada item usados no último treino
+FINGERPRINTS_FILE = "fingerprints.json"
+
+
+def daily_sales(df=None):
+    """Quantidade vendida por item e dia (codigo, date, qty), ordenada por item e data"""
+    if df is None:
+        df = get_dataset("sales", columns=["date", "codigo", "qty"])
+    return (
+        df.groupby(["codigo", "date"], observed=True)["qty"]
+        .sum()
+        .reset_index()
+        .sort_values(["codigo", "date"], kind="stable")
+    )
+
+
+def iter_item_series(daily, codigos=None, last_date=None):
+    """Série diária contínua de cada item, do primeiro dia com venda até `last_date`
+
+    Dias sem venda entram com qty = 0, para que o modelo aprenda também os zeros.
+    """
+    last_date = pd.Timestamp(last_date or daily["date"].max())
+    codigo_values = daily["codigo"].to_numpy()
+    date_values = daily["date"].to_numpy()
+    qty_values = daily["qty"].to_numpy(dtype=np.float64)
+
+    # Fronteiras dos blocos de cada item (daily está ordenado por codigo)
+    boundaries = np.flatnonzero(codigo_values[1:] != codigo_values[:-1]) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [len(daily)]])
+
+    wanted = None if codigos is None else {str(codigo) for codigo in codigos}
+    for start, end in zip(starts, ends):
+        codigo = str(codigo_values[start])
+        if wanted is not None and codigo not in wanted:
+            continue
+        first_date = pd.Timestamp(date_values[start])
+        dates = pd.date_range(first_date, last_date, freq="D")
+        qty = np.zeros(len(dates), dtype=np.float64)
+        offsets = (pd.DatetimeIndex(date_values[start:end]) - first_date).days.to_numpy()
+        np.add.at(qty, offsets, qty_values[start:end])
+        yield codigo, dates, qty
+
+
+def item_fingerprints(daily):
+    """Impressão digital das vendas de cada item: dias com venda, última data e soma de qty"""
+    agg = daily.groupby("codigo", observed=True).agg(
+        rows=("qty", "size"),
+        last_date=("date", "max"),
+        qty_sum=("qty", "sum"),
+    )
+    return {
+        str(codigo): {
+            "rows": int(rows),
+            "last_date": last_date.strftime("%Y-%m-%d"),
+            "qty_sum": round(float(qty_sum), 6),
+        }
+        for codigo, rows, last_date, qty_sum in zip(agg.index, agg["rows"], agg["last_date"], agg["qty_sum"])
+    }
+
+
+def load_fingerprints(models_dir=MODELS_DIR):
+    path = os.path.join(models_dir, FINGERPRINTS_FILE)
+    if not os.path.exists(path):
+        return {"features_version": None, "items": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_fingerprints(fingerprints, models_dir=MODELS_DIR):
+    path = os.path.join(models_dir, FINGERPRINTS_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(fingerprints, f)
+    os.replace(tmp_path, path)
+
+
+def items_to_retrain(current, previous, available, max_age_days=MAX_MODEL_AGE_DAYS):
+    """Códigos cujos dados mudaram, sem modelo (fora de `available`), ou com modelo mais velho que max_age_days"""
+    if previous.get("features_version") != FEATURES_VERSION:
+        return set(current)
+
+    limite = time.time() - max_age_days * 86400
+    retrain = set()
+    for codigo, fingerprint in current.items():
+        anterior = previous["items"].get(codigo)
+        if anterior is None or anterior["data"] != fingerprint:
+            retrain.add(codigo)
+            continue
+        if not anterior["trained"]:
+            continue  # Histórico curto demais e sem vendas novas: continua sem modelo
+        if codigo not in available or anterior.get("trained_at", 0) < limite:
+            retrain.add(codigo)
+    return retrain
+
+
+def save_model_atomic(model, path):
+    """Grava o modelo num arquivo temporário e o move para o destino com os.replace"""
+    tmp_dir = os.path.join(os.path.dirname(path), ".tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    # A extensão define o formato gravado pelo XGBoost
+    tmp_path = os.path.join(tmp_dir, f"{os.getpid()}_{os.path.basename(path)}")
+    model.save_model(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def train_item(codigo, dates, qty, models_dir=MODELS_DIR, params=None, existing=None, since=None):
+    """Treina e grava o modelo de um item; devolve (codigo, treinou)
+
+    Com `existing` (bytes do modelo atual) e `since` (última data do treino
+    anterior), adiciona CONTINUE_ROUNDS árvores ajustadas só aos dias posteriores
+    a `since`. Sem dias novos, ou se o modelo passaria de MAX_MODEL_TREES árvores,
+    treina do zero com todo o histórico.
+    """
+    if len(dates) < MIN_HISTORY_DAYS:
+        return codigo, False
+
+    params = dict(params or TRAIN_PARAMS)
+    xgb_model = None
+    if existing is not None and since is not None:
+        xgb_model = xgb.Booster()
+        xgb_model.load_model(bytearray(existing))
+        novos = dates > pd.Timestamp(since)
+        if novos.any() and xgb_model.num_boosted_rounds() + CONTINUE_ROUNDS <= MAX_MODEL_TREES:
+            params["n_estimators"] = CONTINUE_ROUNDS
+            dates, qty = dates[novos], qty[novos]
+        else:
+            xgb_model = None
+
+    model = xgb.XGBRegressor(**params)
+    model.fit(pd.DataFrame(features_for_dates(dates), columns=FEATURES), qty, xgb_model=xgb_model)
+    save_model_atomic(model, model_path(models_dir, codigo))
+    # Remove o arquivo do item no outro formato, que ficaria desatualizado
+    for fmt in ("json", "ubj"):
+        if fmt != MODEL_FORMAT and os.path.exists(model_path(models_dir, codigo, fmt)):
+            os.remove(model_path(models_dir, codigo, fmt))
+    return codigo, True
+
+
+def _continuation(codigo, fingerprints, registry, continue_training):
+    """(bytes do modelo atual, última data do treino anterior) ou (None, None)"""
+    anterior = fingerprints["items"].get(codigo)
+    if not continue_training or anterior is None or not anterior["trained"] or not registry.has_model(codigo):
+        return None, None
+    return registry.raw(codigo), anterior["data"]["last_date"]
+
+
+def train_all(
+    models_dir=MODELS_DIR,
+    n_jobs=-1,
+    codigos=None,
+    params=None,
+    daily=None,
+    incremental=True,
+    continue_training=False,
+    max_age_days=MAX_MODEL_AGE_DAYS,
+):
+    """Treina um modelo por item em paralelo (um processo por núcleo)
+
+    No modo incremental só os itens devolvidos por items_to_retrain são treinados;
+    as impressões digitais são atualizadas ao final.
+    """
+    os.makedirs(models_dir, exist_ok=True)
+    daily = daily if daily is not None else daily_sales()
+
+    current = item_fingerprints(daily)
+    fingerprints = load_fingerprints(models_dir)
+    if fingerprints.get("features_version") != FEATURES_VERSION:
+        # Features mudaram: os modelos antigos não servem de ponto de partida
+        continue_training = False
+
+    registry = ModelRegistry(models_dir, max_bytes=0, check_interval=float("inf"))
+    pedidos = set(current) if codigos is None else {str(codigo) for codigo in codigos} & set(current)
+    selecionados = set(pedidos)
+    if incremental:
+        selecionados &= items_to_retrain(current, fingerprints, set(registry.index()), max_age_days)
+
+    resultados = Parallel(n_jobs=n_jobs)(
+        delayed(train_item)(
+            codigo, dates, qty, models_dir, params, *_continuation(codigo, fingerprints, registry, continue_training)
+        )
+        for codigo, dates, qty in iter_item_series(daily, selecionados)
+    )
+
+    if fingerprints.get("features_version") != FEATURES_VERSION:
+        fingerprints = {"features_version": FEATURES_VERSION, "items": {}}
+    agora = time.time()
+    for codigo, treinou in resultados:
+        fingerprints["items"][codigo] = {"data": current[codigo], "trained": treinou, "trained_at": agora}
+    save_fingerprints(fingerprints, models_dir)
+
+    treinados = sum(1 for _, treinou in resultados if treinou)
+    return {
+        "trained": treinados,
+        "skipped": len(resultados) - treinados,
+        # Só entre os itens pedidos (com --items, os demais não contam)
+        "unchanged": len(pedidos) - len(resultados),
+    }
+
+
+def pack_models(models_dir=MODELS_DIR, remove_files=True):
+    """Junta todos os modelos do diretório num único pacote (BUNDLE_FILE)
+
+    Os arquivos soltos incluídos no pacote são apagados em seguida (se não
+    mudaram nesse meio tempo), o que elimina milhares de arquivos pequenos.
+    """
+    registry = ModelRegistry(models_dir, max_bytes=0, check_interval=float("inf"))
+    entries = registry.index()
+
+    index, blobs, offset = {}, [], 0
+    for codigo in sorted(entries):
+        blob = registry.raw(codigo)
+        if entries[codigo][1].endswith(".json"):
+            booster = xgb.Booster()
+            booster.load_model(bytearray(blob))
+            blob = booster.save_raw(raw_format="ubj")
+        index[codigo] = [offset, len(blob)]
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = json.dumps(index).encode()
+    path = os.path.join(models_dir, BUNDLE_FILE)
+    tmp_dir = os.path.join(models_dir, ".tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, f"{os.getpid()}_{BUNDLE_FILE}")
+    with open(tmp_path, "wb") as f:
+        f.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, len(header)))
+        f.write(header)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, path)
+
+    if remove_files:
+        for mtime_ns, file_path, bundle, _, _ in entries.values():
+            if bundle is None and MODEL_FILE_RE.match(os.path.basename(file_path)):
+                try:
+                    if os.stat(file_path).st_mtime_ns == mtime_ns:
+                        os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+    return {"models": len(index), "bytes": offset}
+
+
+def train_global(model_dir=GLOBAL_MODEL_DIR, n_jobs=-1, params=None, daily=None):
+    """Treina um único modelo para todos os itens (atributos do item como features)
+
+    O mapa codigo -> códigos dos atributos vai gravado no próprio arquivo do modelo
+    (atributo do booster), para que modelo e vocabulário sejam trocados juntos.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    daily = daily if daily is not None else daily_sales()
+    items = encode_items(item_attributes())
+
+    blocos_X, blocos_y = [], []
+    for codigo, dates, qty in iter_item_series(daily, items):
+        if len(dates) < MIN_HISTORY_DAYS:
+            continue
+        blocos_X.append(global_matrix(features_for_dates(dates), [items[codigo]]))
+        blocos_y.append(qty)
+    if not blocos_X:
+        return {"trained": 0, "rows": 0}
+
+    model = xgb.XGBRegressor(**{**(params or GLOBAL_TRAIN_PARAMS), "n_jobs": n_jobs})
+    model.fit(pd.DataFrame(np.vstack(blocos_X), columns=GLOBAL_FEATURES), np.concatenate(blocos_y))
+    model.get_booster().set_attr(items=json.dumps(items), features_version=str(FEATURES_VERSION))
+    save_model_atomic(model, os.path.join(model_dir, GLOBAL_MODEL_FILE))
+    # Remove o modelo no outro formato, que ficaria desatualizado
+    for fmt in ("json", "ubj"):
+        antigo = os.path.join(model_dir, f"modelo.{fmt}")
+        if fmt != MODEL_FORMAT and os.path.exists(antigo):
+            os.remove(antigo)
+    return {"trained": len(blocos_X), "rows": int(sum(len(y) for y in blocos_y))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Treina os modelos XGBoost por item a partir de data/sales.csv")
+    parser.add_argument("--models-dir", default=MODELS_DIR, help="Diretório de saída dos modelos")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Processos em paralelo (-1 = todos os núcleos)")
+    parser.add_argument("--items", nargs="*", help="Treina apenas estes códigos")
+    parser.add_argument("--full", action="store_true", help="Treina todos os itens, mesmo sem vendas novas")
+    parser.add_argument(
+        "--continue-training", action="store_true", help="Continua o boosting a partir do modelo existente"
+    )
+    parser.add_argument(
+        "--max-age-days", type=float, default=MAX_MODEL_AGE_DAYS, help="Idade máxima de um modelo sem retreino"
+    )
+    parser.add_argument(
+        "--global", dest="global_model", action="store_true", help="Treina o modelo global (modelo_global/)"
+    )
+    parser.add_argument(
+        "--bundle", action="store_true", help="Junta os modelos num único pacote mapeável em memória ao final"
+    )
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    if args.global_model:
+        resumo = train_global(n_jobs=args.n_jobs)
+        print(
+            f"Modelo global treinado com {resumo['trained']} itens ({resumo['rows']} linhas) "
+            f"em {time.perf_counter() - inicio:.1f}s"
+        )
+        return
+
+    resumo = train_all(
+        models_dir=args.models_dir,
+        n_jobs=args.n_jobs,
+        codigos=args.items,
+        incremental=not args.full,
+        continue_training=args.continue_training,
+        max_age_days=args.max_age_days,
+    )
+    print(
+        f"{resumo['trained']} modelos treinados, {resumo['skipped']} itens ignorados, "
+        f"{resumo['unchanged']} sem alterações em {time.perf_counter() - inicio:.1f}s"
+    )
+    if args.bundle:
+        pacote = pack_models(args.models_dir)
+        print(f"{pacote['models']} modelos ({pacote['bytes'] / 1024 / 1024:.1f} MB) em {BUNDLE_FILE}")
+
+
+if __name__ == "__main__":
+    main()